@@ -32,6 +32,30 @@ const youtube = google.youtube({
 axios.defaults.headers.common['Referer'] = APPLICATION_URL;
 axios.defaults.headers.common['Origin'] = APPLICATION_URL;
 
+// How long to keep asking for a transcript that is still being generated by
+// Whisper before passing the Python API's 202 on to the client
+const TRANSCRIPT_WAIT_MS = Number(process.env.TRANSCRIPT_WAIT_MS || 60000);
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+// Request a transcript, waiting out 202 (Whisper job running) responses as
+// long as their Retry-After fits in TRANSCRIPT_WAIT_MS
+async function fetchTranscriptResponse(videoId) {
+    const started = Date.now();
+    for (;;) {
+        const response = await axios.get("https://py.klipsmart.shop" + `/transcript/${videoId}`);
+        if (response.status !== 202) {
+            return response;
+        }
+        const retryAfterMs = Number(response.headers['retry-after'] || response.data.retryAfter || 5) * 1000;
+        if (Date.now() - started + retryAfterMs > TRANSCRIPT_WAIT_MS) {
+            return response;
+        }
+        console.log(`Transcript for ${videoId} is being generated, asking again in ${retryAfterMs / 1000}s`);
+        await sleep(retryAfterMs);
+    }
+}
+
 function getAuthUrl() {
     return oauth2Client.generateAuthUrl({
         access_type: 'offline',
@@ -94,8 +118,13 @@ const getTranscript = async (req, res) => {
             try {
                 console.log('Trying to fetch English transcript...');
                 console.log("https://py.klipsmart.shop" + `/transcript/${videoId}`);
-                transcriptList = await axios.get("https://py.klipsmart.shop" + `/transcript/${videoId}`);
-                transcriptList = transcriptList.data.data;
+                const transcriptResponse = await fetchTranscriptResponse(videoId);
+                if (transcriptResponse.status === 202) {
+                    console.log(`Transcript for ${videoId} is still being generated`);
+                    res.set('Retry-After', transcriptResponse.headers['retry-after'] || String(transcriptResponse.data.retryAfter || 5));
+                    return res.status(202).json(transcriptResponse.data);
+                }
+                transcriptList = transcriptResponse.data.data;
                 console.log('Successfully fetched English transcript');
             } catch (err) {
                 transcriptError = err;
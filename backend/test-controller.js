@@ -7,6 +7,10 @@ const mockReq = (videoId) => ({
 });
 
 const mockRes = {
+  set: function(name, value) {
+    console.log(`Header: ${name}: ${value}`);
+    return this;
+  },
   status: function(statusCode) {
     console.log(`Status Code: ${statusCode}`);
     return this;
@@ -64,6 +64,22 @@ const OutputPage = () => {
     mergeClips();
   }, []);
 
+  // Poll a queued merge job until it finishes and return its result
+  const waitForMergeJob = async (statusUrl, retryAfter) => {
+    let delay = Math.min(Math.max(Number(retryAfter) || 5, 2), 15) * 1000;
+    for (;;) {
+      await new Promise(resolve => setTimeout(resolve, delay));
+      const { data } = await axios.get(PYTHON_API + statusUrl);
+      if (data.jobStatus === 'completed') {
+        return data.result;
+      }
+      if (data.jobStatus === 'failed') {
+        throw Object.assign(new Error('Merge failed'), { response: { data: data.result || {} } });
+      }
+      delay = Math.min(Math.max(Math.round(data.estimatedWaitSeconds || 0), 2), 15) * 1000;
+    }
+  };
+
   // Function to send clips data to backend for merging
   const mergeClips = async () => {
     setLoading(true);
@@ -79,8 +95,12 @@ const OutputPage = () => {
         endTime: clip.endTime
       }));
 
-      // Make request to backend for merging
-      const response = await axios.post(PYTHON_API + '/merge-clips', { clips: clipsToMerge });
+      // Make request to backend for merging. Long renders are answered with
+      // 202 and a status URL, which is polled until the job has finished.
+      let response = await axios.post(PYTHON_API + '/merge-clips', { clips: clipsToMerge });
+      if (response.status === 202 && response.data?.statusUrl) {
+        response = { data: await waitForMergeJob(response.data.statusUrl, response.headers['retry-after']) };
+      }
 
       if (response.data && response.data.success && response.data.s3Url) {
         // Set the video URL to the S3 URL returned from the backend
@@ -0,0 +1,97 @@
+import numpy as np
+
+SENTENCE_ENDINGS = ('.', '?', '!', '…')
+
+
+class SegmentArrays:
+    """Column arrays of one transcript's segments, built once and reused for every re-cut."""
+
+    __slots__ = ('starts', 'ends', 'lengths', 'sentence_ends', 'texts')
+
+    def __init__(self, segments):
+        count = len(segments)
+        self.texts = [segment['text'] for segment in segments]
+        self.starts = np.fromiter((segment['startTime'] for segment in segments), np.float64, count)
+        self.ends = np.fromiter((segment['endTime'] for segment in segments), np.float64, count)
+        self.lengths = np.fromiter(map(len, self.texts), np.int64, count)
+        self.sentence_ends = np.fromiter(
+            (text.rstrip().endswith(SENTENCE_ENDINGS) for text in self.texts), np.bool_, count
+        )
+
+
+def _unit_boundaries(arrays, max_gap, max_duration):
+    """Index of the last segment of every unit: a sentence, cut at long pauses and at ``max_duration``."""
+    count = len(arrays.starts)
+    gaps = arrays.starts[1:] - arrays.ends[:-1]
+    hard_breaks = np.append(gaps > max_gap, True)
+    is_last = arrays.sentence_ends | hard_breaks
+    is_last[-1] = True
+
+    # Split units longer than max_duration at the segment where they cross each
+    # multiple of it. Each pass only shortens units, so a few passes settle it.
+    for _ in range(8):
+        unit_ids = np.concatenate(([0], np.cumsum(is_last[:-1])))
+        first = np.flatnonzero(np.concatenate(([True], is_last[:-1])))
+        unit_starts = arrays.starts[first][unit_ids]
+        buckets = np.floor((arrays.ends - unit_starts) / max_duration).astype(np.int64)
+        split = np.zeros(count, dtype=bool)
+        split[:-1] = (buckets[1:] != buckets[:-1]) & (unit_ids[1:] == unit_ids[:-1])
+        if not split.any():
+            break
+        is_last |= split
+    return np.flatnonzero(is_last), hard_breaks
+
+
+def clip_candidates(arrays, min_duration=15.0, max_duration=60.0, max_gap=1.5, overlap=False):
+    """Merge caption segments into clip candidates between ``min_duration`` and ``max_duration`` seconds.
+
+    Segments are first grouped into units that end at sentence ends, pauses
+    longer than ``max_gap`` and every ``max_duration`` seconds. Each unit then
+    starts a candidate that runs to the first unit end at least
+    ``min_duration`` later, without crossing a long pause. With ``overlap``
+    false only a non-overlapping sequence of candidates is returned.
+
+    Returns a list of ``(first_segment, last_segment, start, end, chars)``.
+    """
+    if len(arrays.starts) == 0:
+        return []
+
+    lasts, hard_breaks = _unit_boundaries(arrays, max_gap, max_duration)
+    firsts = np.concatenate(([0], lasts[:-1] + 1))
+    unit_starts = arrays.starts[firsts]
+    # Running maximum: auto-generated captions overlap, but the search needs sorted ends
+    unit_ends = np.maximum.accumulate(np.maximum.reduceat(arrays.ends, firsts))
+    unit_chars = np.add.reduceat(arrays.lengths, firsts)
+    # Units between the same two long pauses share a block; clips stay inside one block
+    blocks = np.concatenate(([0], np.cumsum(hard_breaks[lasts][:-1])))
+    chars_before = np.concatenate(([0], np.cumsum(unit_chars)))
+
+    # For every starting unit, the first unit that brings the clip to min_duration
+    ends_at = np.searchsorted(unit_ends, unit_starts + min_duration, side='left')
+    ends_at = np.minimum(ends_at, len(lasts) - 1)
+    durations = unit_ends[ends_at] - unit_starts
+    valid = (
+        (durations >= min_duration)
+        & (durations <= max_duration)
+        & (blocks[ends_at] == blocks)
+    )
+
+    starts_idx = np.flatnonzero(valid)
+    if not overlap:
+        chosen = []
+        next_free = 0
+        for index in starts_idx:
+            if index >= next_free:
+                chosen.append(index)
+                next_free = ends_at[index] + 1
+        starts_idx = np.asarray(chosen, dtype=np.int64)
+
+    end_idx = ends_at[starts_idx]
+    chars = chars_before[end_idx + 1] - chars_before[starts_idx]
+    return list(zip(
+        firsts[starts_idx].tolist(),
+        lasts[end_idx].tolist(),
+        unit_starts[starts_idx].tolist(),
+        unit_ends[end_idx].tolist(),
+        chars.tolist()
+    ))
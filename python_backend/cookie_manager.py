@@ -0,0 +1,246 @@
+import json
+import os
+import sys
+import threading
+import time
+
+import yt_dlp
+from yt_dlp.cookies import extract_cookies_from_browser
+
+TEST_VIDEO_URL = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+COOKIE_FILE_HEADERS = ('# HTTP Cookie File', '# Netscape HTTP Cookie File')
+BOT_CHECK_MESSAGE = "Sign in to confirm you're not a bot"
+
+BROWSER_PROFILE_PATHS = {
+    'win32': {
+        'chrome': os.path.expanduser('~\\AppData\\Local\\Google\\Chrome\\User Data'),
+        'firefox': os.path.expanduser('~\\AppData\\Roaming\\Mozilla\\Firefox\\Profiles'),
+        'edge': os.path.expanduser('~\\AppData\\Local\\Microsoft\\Edge\\User Data'),
+        'brave': os.path.expanduser('~\\AppData\\Local\\BraveSoftware\\Brave-Browser\\User Data'),
+    },
+    'linux': {
+        'chrome': os.path.expanduser('~/.config/google-chrome'),
+        'chrome-flatpak': os.path.expanduser('~/.var/app/com.google.Chrome/config/google-chrome'),
+        'firefox': os.path.expanduser('~/.mozilla/firefox'),
+        'brave': os.path.expanduser('~/.config/BraveSoftware/Brave-Browser'),
+    },
+    'darwin': {  # macOS
+        'chrome': os.path.expanduser('~/Library/Application Support/Google/Chrome'),
+        'firefox': os.path.expanduser('~/Library/Application Support/Firefox/Profiles'),
+        'safari': os.path.expanduser('~/Library/Safari'),
+        'brave': os.path.expanduser('~/Library/Application Support/BraveSoftware/Brave-Browser'),
+    }
+}
+
+
+def platform_browsers():
+    """Browsers to try on this platform, most common first."""
+    if sys.platform == 'win32':
+        return ['chrome', 'firefox', 'edge', 'brave']
+    if sys.platform.startswith('linux'):
+        return ['chrome', 'firefox', 'chromium', 'brave']
+    if sys.platform == 'darwin':
+        return ['chrome', 'firefox', 'safari', 'brave']
+    return ['chrome', 'firefox']
+
+
+def default_profile_path(browser):
+    path = BROWSER_PROFILE_PATHS.get(sys.platform, {}).get(browser)
+    return path if path and os.path.exists(path) else None
+
+
+def has_cookie_header(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.readline().strip().startswith(COOKIE_FILE_HEADERS)
+    except OSError:
+        return False
+
+
+class CookieManager:
+    """Keep the yt-dlp cookies file valid from a background thread.
+
+    Requests only call ``cookiefile()``, which reads the cached state and
+    never touches a browser or YouTube. The background thread checks the jar
+    every ``validate_interval`` seconds (sooner after ``report_failure``):
+    if the file is missing or malformed it extracts cookies from the
+    configured browsers, then tests them against YouTube. The outcome is
+    saved with a timestamp to ``status_file`` so that every process on the
+    host reuses a recent check instead of repeating it. Extraction and
+    testing run inside the process through the yt-dlp API.
+    """
+
+    def __init__(self, cookies_file, browser_config_file, status_file, validate_interval=6 * 3600,
+                 retry_interval=600, socket_timeout=15):
+        self.cookies_file = cookies_file
+        self.browser_config_file = browser_config_file
+        self.status_file = status_file
+        self.validate_interval = validate_interval
+        self.retry_interval = retry_interval
+        self.socket_timeout = socket_timeout
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._force = False
+        self._thread = None
+        self._status = self._load_status() or {'checkedAt': None}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='cookie-manager', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            force, self._force = self._force, False
+            try:
+                self.refresh(force=force)
+            except Exception as e:
+                print(f"Error refreshing cookies: {str(e)}")
+            interval = self.validate_interval if self._status.get('worksWithYoutube') else self.retry_interval
+            self._wake.wait(interval)
+            self._wake.clear()
+
+    def cookiefile(self):
+        """Path of the current cookie jar, or None if there is no usable one."""
+        status = self._status
+        if status.get('hasCookies') and status.get('validFormat'):
+            return self.cookies_file
+        if status.get('checkedAt') is None and self._file_usable():
+            # Not checked yet (the first check is still running): use the file as is
+            return self.cookies_file
+        return None
+
+    def status(self):
+        return dict(self._status)
+
+    def report_failure(self, error):
+        """Called when a download was refused for want of valid cookies; re-checks in the background."""
+        print(f"Cookies rejected by YouTube ({error}), scheduling a refresh")
+        with self._lock:
+            self._status = dict(self._status, worksWithYoutube=False)
+        self._force = True
+        self._wake.set()
+
+    def refresh_soon(self):
+        """Re-check the jar in the background now instead of at the next interval."""
+        self._force = True
+        self._wake.set()
+
+    def _file_usable(self):
+        return (os.path.exists(self.cookies_file) and os.path.getsize(self.cookies_file) >= 100
+                and has_cookie_header(self.cookies_file))
+
+    def refresh(self, force=False):
+        """Extract cookies if the jar is unusable, then test it against YouTube."""
+        shared = self._load_status()
+        mtime = os.path.getmtime(self.cookies_file) if os.path.exists(self.cookies_file) else None
+        if (not force and shared and shared.get('checkedAt')
+                and time.time() - shared['checkedAt'] < (
+                    self.validate_interval if shared.get('worksWithYoutube') else self.retry_interval)
+                and shared.get('fileModified') == mtime):
+            self._status = shared
+            return self.status()
+
+        source = None
+        if not self._file_usable():
+            print(f"No valid cookies file found at {self.cookies_file}, attempting to extract from browser")
+            source = self.extract_from_browsers()
+
+        status = {
+            'hasCookies': os.path.exists(self.cookies_file) and os.path.getsize(self.cookies_file) >= 100,
+            'validFormat': self._file_usable(),
+            'worksWithYoutube': None,
+            'error': None,
+            'source': source or (self._status.get('source') if self._file_usable() else None),
+        }
+        if status['validFormat']:
+            status['worksWithYoutube'], status['error'] = self.test_cookies(self.cookies_file)
+            if not status['worksWithYoutube'] and source is None:
+                # The jar has expired or been flagged: try a fresh one from the browser
+                source = self.extract_from_browsers()
+                if source is not None:
+                    status['source'] = source
+                    status['worksWithYoutube'], status['error'] = self.test_cookies(self.cookies_file)
+        status['checkedAt'] = time.time()
+        status['fileModified'] = os.path.getmtime(self.cookies_file) if status['hasCookies'] else None
+        with self._lock:
+            self._status = status
+        self._save_status(status)
+        return self.status()
+
+    def browser_paths(self):
+        if not os.path.exists(self.browser_config_file):
+            return {}
+        try:
+            with open(self.browser_config_file, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading browser paths: {str(e)}")
+            return {}
+
+    def extract_from_browsers(self):
+        """Try each browser, those with a saved profile path first; returns the one that worked."""
+        custom_paths = self.browser_paths()
+        browsers = platform_browsers()
+        browsers = [b for b in browsers if b in custom_paths] + [b for b in browsers if b not in custom_paths]
+        for browser in browsers:
+            profile = custom_paths.get(browser)
+            if not profile or not os.path.exists(profile):
+                profile = default_profile_path(browser)
+            ok, error = self.extract(browser, profile)
+            if ok:
+                return browser
+            print(f"Failed to extract cookies from {browser}: {error}")
+        return None
+
+    def extract(self, browser, profile=None, target=None):
+        """Write ``browser``'s YouTube cookies to ``target`` (the managed jar by default).
+
+        Returns ``(ok, error)``. The file is replaced atomically, so readers
+        never see a partial jar.
+        """
+        target = target or self.cookies_file
+        try:
+            jar = extract_cookies_from_browser(browser, profile)
+            youtube_cookies = [cookie for cookie in jar if 'youtube.com' in cookie.domain or 'google.com' in cookie.domain]
+            if not youtube_cookies:
+                return False, f"No YouTube cookies found in {browser}"
+            tmp_path = f"{target}.tmp"
+            jar.save(tmp_path)
+            os.replace(tmp_path, target)
+        except Exception as e:
+            return False, str(e)
+        print(f"Successfully extracted {len(youtube_cookies)} YouTube cookies from {browser}")
+        return True, None
+
+    def test_cookies(self, cookies_file):
+        """Fetch a video's metadata with the jar; returns ``(works, error)``."""
+        options = {
+            'cookiefile': cookies_file,
+            'skip_download': True,
+            'quiet': True,
+            'no_warnings': True,
+            'socket_timeout': self.socket_timeout,
+        }
+        try:
+            with yt_dlp.YoutubeDL(options) as ydl:
+                ydl.extract_info(TEST_VIDEO_URL, download=False, process=False)
+        except Exception as e:
+            return False, str(e)
+        return True, None
+
+    def _load_status(self):
+        try:
+            with open(self.status_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_status(self, status):
+        try:
+            tmp_path = f"{self.status_file}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(status, f)
+            os.replace(tmp_path, self.status_file)
+        except OSError as e:
+            print(f"Error saving cookie status: {str(e)}")
@@ -0,0 +1,100 @@
+import random
+import subprocess
+import time
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a job's time budget ran out; ``stage`` is where it happened."""
+
+    def __init__(self, stage, budget):
+        super().__init__(f"Deadline of {budget:.0f}s exceeded during {stage}")
+        self.stage = stage
+        self.budget = budget
+
+
+class Deadline:
+    """Time budget for one job, carried through every stage that may block.
+
+    Stages ask for timeouts with ``timeout()``, which never exceeds what is
+    left of the budget, and wait between retries with ``backoff()``
+    (exponential with full jitter, cut short by the deadline). Stages
+    marked with ``begin()`` are timed, so a job that runs out of time can
+    report where it went. A budget of None or 0 means no deadline.
+    """
+
+    def __init__(self, seconds):
+        self.budget = seconds or None
+        self.started = time.monotonic()
+        self.expires_at = self.started + seconds if seconds else None
+        self.stages = []
+        self._current = 'start'
+        self._stage_started = None
+
+    def remaining(self):
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def check(self, stage=None):
+        """Raise DeadlineExceeded if the budget has run out."""
+        if self.expired():
+            raise DeadlineExceeded(stage or self._current, self.budget)
+
+    def timeout(self, cap=None, stage=None):
+        """A timeout for the next blocking call: ``cap`` or what is left of the budget, whichever is less."""
+        self.check(stage)
+        remaining = self.remaining()
+        if remaining is None:
+            return cap
+        return min(cap, remaining) if cap is not None else remaining
+
+    def backoff_delay(self, attempt, base=1.0, cap=30.0, stage=None):
+        """Seconds to wait before retry ``attempt`` (from 1); raises DeadlineExceeded if that would pass the deadline."""
+        delay = random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+        remaining = self.remaining()
+        if remaining is not None and delay >= remaining:
+            raise DeadlineExceeded(stage or self._current, self.budget)
+        return delay
+
+    def backoff(self, attempt, base=1.0, cap=30.0, stage=None):
+        """Sleep before retry ``attempt``, as long as ``backoff_delay`` says."""
+        time.sleep(self.backoff_delay(attempt, base, cap, stage))
+
+    def begin(self, stage):
+        """Start timing ``stage``, ending the previous one; timeouts raised from here on name it."""
+        self.end()
+        self._current = stage
+        self._stage_started = time.monotonic()
+
+    def end(self, ok=True):
+        if self._stage_started is not None:
+            self.stages.append({
+                'stage': self._current,
+                'seconds': round(time.monotonic() - self._stage_started, 2),
+                'ok': ok,
+            })
+            self._stage_started = None
+
+    def run(self, cmd, cap=None, stage=None, **kwargs):
+        """``subprocess.run`` limited to the time left; an overrun raises DeadlineExceeded."""
+        try:
+            return subprocess.run(cmd, timeout=self.timeout(cap, stage), **kwargs)
+        except subprocess.TimeoutExpired:
+            if self.expired():
+                raise DeadlineExceeded(stage or self._current, self.budget)
+            raise
+
+    def summary(self):
+        """Budget, time used and per-stage timings; a stage still open is listed as not finished."""
+        stages = list(self.stages)
+        if self._stage_started is not None:
+            stages.append({'stage': self._current, 'seconds': round(time.monotonic() - self._stage_started, 2), 'ok': False})
+        return {
+            'budgetSeconds': self.budget,
+            'elapsedSeconds': round(time.monotonic() - self.started, 2),
+            'stages': stages,
+        }
@@ -0,0 +1,566 @@
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+
+import requests
+
+from cookie_manager import BOT_CHECK_MESSAGE
+from deadline import Deadline, DeadlineExceeded
+from download_scheduler import DownloadScheduler, YOUTUBE_MEDIA_HOST
+
+MIN_VIDEO_BYTES = 1024
+CHUNK_BYTES = 256 * 1024
+# Output height sources are chosen for when the caller does not give one
+DEFAULT_OUTPUT_HEIGHT = 720
+
+
+def ytdlp_format_spec(height):
+    """yt-dlp format selector for a render ``height`` pixels tall.
+
+    Picks the smallest stream at least that tall, preferring in turn a
+    progressive H.264/AAC stream (no mux step), H.264 video with AAC audio,
+    then any MP4 video with M4A audio. Sources shorter than ``height`` fall
+    back to their best H.264 or MP4 streams.
+    """
+    return '/'.join([
+        f"worst[height>={height}][vcodec^=avc1][acodec^=mp4a]",
+        f"worstvideo[height>={height}][vcodec^=avc1]+bestaudio[acodec^=mp4a]",
+        f"worstvideo[height>={height}][ext=mp4]+bestaudio[ext=m4a]",
+        "bestvideo[vcodec^=avc1]+bestaudio[acodec^=mp4a]",
+        "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
+    ])
+
+
+def stream_codecs(item):
+    """Codecs listed in a RapidAPI format's ``mimeType``, e.g. ``['avc1.42001E', 'mp4a.40.2']``."""
+    match = re.search(r'codecs="([^"]*)"', item.get('mimeType') or '')
+    return [codec.strip() for codec in match.group(1).split(',')] if match else []
+
+
+def rank_streams(items, height):
+    """RapidAPI formats with a URL, best first for a render ``height`` pixels tall.
+
+    Streams at least ``height`` tall come first, H.264/AAC before other
+    codecs, then smallest and lowest bitrate first. Shorter streams follow,
+    tallest first, H.264/AAC first at equal height.
+    """
+    def key(item):
+        item_height = item.get('height') or 0
+        bitrate = item.get('bitrate') or 0
+        codecs = stream_codecs(item)
+        compatible = all(codec.startswith(('avc1', 'mp4a')) for codec in codecs) if codecs else False
+        if item_height >= height:
+            return (0, not compatible, item_height, bitrate)
+        return (1, -item_height, not compatible, -bitrate)
+    return sorted((item for item in items if item.get('url')), key=key)
+
+
+# yt-dlp error messages that describe the video itself rather than the way it was fetched
+VIDEO_ERROR_REASONS = (
+    ('Private video', 'private'),
+    ('This video has been removed', 'removed'),
+    ('Video unavailable', 'unavailable'),
+    ('This video is not available', 'unavailable'),
+    ('not made this video available in your country', 'not available in this country'),
+    ('members-only', 'members only'),
+    ("available to this channel's members", 'members only'),
+    ('Sign in to confirm your age', 'age-restricted'),
+    ('This live event will begin', 'upcoming live event'),
+    ('Premieres in', 'upcoming premiere'),
+)
+
+
+def video_error_reason(message):
+    """Why a video cannot be downloaded by any provider, from a yt-dlp error message; None if it could."""
+    for pattern, reason in VIDEO_ERROR_REASONS:
+        if pattern in message:
+            return reason
+    return None
+
+
+class DownloadFailed(Exception):
+    """Raised when every download provider failed or was skipped for a video."""
+
+
+class VideoUnavailable(DownloadFailed):
+    """Raised when the video itself cannot be downloaded (private, removed, age-restricted).
+
+    This is not held against the provider that reported it, and no other
+    provider is tried.
+    """
+
+    def __init__(self, video_id, reason):
+        super().__init__(f"Video {video_id} cannot be downloaded: {reason}")
+        self.video_id = video_id
+        self.reason = reason
+
+
+class ProviderUnavailable(Exception):
+    """Raised by a provider that cannot serve this video at the requested quality.
+
+    The router tries the next provider and does not count it as a failure.
+    """
+
+
+class InvalidSource(Exception):
+    """Raised when a downloaded file fails validation; counted against the source, not the provider."""
+
+
+class DownloadProvider:
+    """Fetches one YouTube video to a local file. Subclasses implement ``download``."""
+
+    name = None
+
+    def download(self, video_id, output_path, height=None, deadline=None):
+        """Download to ``output_path``; ``height`` is the render's output height, for choosing a stream.
+
+        ``deadline`` (a Deadline) bounds every request and retry made.
+        """
+        raise NotImplementedError
+
+
+class RapidApiProvider(DownloadProvider):
+    """Resolve a stream URL through the ytstream RapidAPI and download it in one request.
+
+    With a ``url_cache`` every resolution is stored for all formats the API
+    returned, so later downloads of the same video skip the metadata call.
+    Formats are ``combined`` (audio and video in one stream) and
+    ``adaptive`` (the first adaptive stream). Combined streams are picked
+    per output height with ``rank_streams`` and cached under
+    ``combined-<height>p``. This provider cannot mux, so when no combined
+    stream is as tall as the output (or the video's tallest stream, if
+    that is shorter) it declines with ProviderUnavailable.
+
+    Downloads are streamed to disk through ``scheduler`` (a
+    DownloadScheduler) for connection and bandwidth limits. Metadata calls
+    that fail with a connection error, 429 or 5xx are retried up to
+    ``retries`` times with jittered exponential backoff.
+    """
+
+    name = 'rapidapi'
+
+    def __init__(self, api_key, host='ytstream-download-youtube-videos.p.rapidapi.com',
+                 metadata_timeout=30, download_timeout=90, url_cache=None, scheduler=None, retries=2):
+        self.api_key = api_key
+        self.host = host
+        self.metadata_timeout = metadata_timeout
+        self.download_timeout = download_timeout
+        self.url_cache = url_cache
+        self.scheduler = scheduler or DownloadScheduler(max_connections=None, max_per_host=None)
+        self.retries = retries
+
+    def resolve(self, video_id, fmt='combined', height=None, deadline=None):
+        """Return ``(url, cached)`` for a video's stream in ``fmt``."""
+        deadline = deadline or Deadline(None)
+        height = height or DEFAULT_OUTPUT_HEIGHT
+        cache_key = f"combined-{height}p" if fmt == 'combined' else fmt
+        if self.url_cache is not None:
+            hit = self.url_cache.get(video_id, cache_key)
+            if hit is not None:
+                print(f"Using cached {fmt} stream URL for {video_id} ({hit[1] or 'unknown quality'})")
+                return hit[0], True
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = requests.get(
+                    f"https://{self.host}/dl?id={video_id}",
+                    headers={'X-RapidAPI-Key': self.api_key, 'X-RapidAPI-Host': self.host},
+                    timeout=deadline.timeout(self.metadata_timeout)
+                )
+                response.raise_for_status()
+                break
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.HTTPError) as e:
+                status_code = getattr(e.response, 'status_code', None)
+                if attempt > self.retries or (status_code is not None and status_code < 500 and status_code != 429):
+                    raise
+                print(f"RapidAPI metadata request for {video_id} failed ({str(e)}), retry {attempt} of {self.retries}")
+                deadline.backoff(attempt)
+        result = response.json()
+
+        adaptive_formats = result.get('adaptiveFormats', [])
+        formats = result.get('formats', [])
+        if not isinstance(adaptive_formats, list):
+            adaptive_formats = []
+        if not isinstance(formats, list):
+            formats = []
+        if not adaptive_formats and not formats:
+            raise ValueError(f"No valid formats found via RapidAPI for video {video_id}")
+
+        resolved = {}
+        # Adaptive streams lack audio and this provider cannot mux, so only progressive
+        # streams are combined; a source shorter than ``height`` is wanted at its tallest
+        tallest = max((item.get('height') or 0 for item in formats + adaptive_formats), default=0)
+        target = min(height, tallest) if tallest else height
+        combined = [item for item in rank_streams(formats, target) if (item.get('height') or 0) >= target]
+        if combined:
+            resolved[f"combined-{height}p"] = combined[0]
+        if adaptive_formats and adaptive_formats[0].get('url'):
+            resolved['adaptive'] = adaptive_formats[0]
+        if self.url_cache is not None:
+            for name, item in resolved.items():
+                self.url_cache.put(video_id, name, item['url'], item.get('qualityLabel'))
+
+        if cache_key not in resolved:
+            if fmt == 'combined':
+                raise ProviderUnavailable(f"No progressive stream of at least {target}p via RapidAPI for video {video_id}")
+            raise ValueError(f"No valid {fmt} download URL found via RapidAPI for video {video_id}")
+        item = resolved[cache_key]
+        print(f"Using RapidAPI format: {item.get('qualityLabel', 'unknown quality')} ({', '.join(stream_codecs(item)) or 'unknown codecs'})")
+        return item['url'], False
+
+    def download(self, video_id, output_path, height=None, deadline=None):
+        deadline = deadline or Deadline(None)
+        download_url, cached = self.resolve(video_id, height=height, deadline=deadline)
+        try:
+            size = self._fetch(download_url, output_path, deadline)
+        except requests.exceptions.HTTPError:
+            if not cached:
+                raise
+            # The signed URL was rejected before its expiry (e.g. bound to another IP)
+            print(f"Cached stream URL for {video_id} rejected, resolving again")
+            self.url_cache.invalidate(video_id)
+            download_url, _ = self.resolve(video_id, height=height, deadline=deadline)
+            size = self._fetch(download_url, output_path, deadline)
+        if size < MIN_VIDEO_BYTES:
+            raise ValueError("Downloaded file via RapidAPI is too small or empty.")
+        print(f"RapidAPI download completed: {size} bytes")
+
+    def _fetch(self, url, output_path, deadline):
+        """Stream ``url`` to ``output_path`` within the scheduler's limits; returns the bytes written."""
+        with self.scheduler.transfer(url, deadline) as transfer:
+            with requests.get(url, stream=True, timeout=deadline.timeout(self.download_timeout)) as response:
+                response.raise_for_status()
+                with open(output_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=CHUNK_BYTES):
+                        f.write(chunk)
+                        transfer.consume(len(chunk))
+                        deadline.check()
+        return transfer.bytes
+
+
+class YtDlpProvider(DownloadProvider):
+    """Download with the shared in-process yt-dlp engine.
+
+    Downloads never extract or test cookies themselves; a bot-check refusal
+    is reported to the cookie manager, which refreshes the jar in the
+    background. Each download holds one ``scheduler`` connection slot, and
+    its progress hook applies the bandwidth cap.
+
+    HTTP, fragment and extractor errors are retried at most ``retries``
+    times per call, with jittered exponential backoff, and the progress
+    hook aborts a download that outlives its deadline.
+    """
+
+    name = 'ytdlp'
+
+    def __init__(self, engine, cookie_manager, format_spec=None, scheduler=None, retries=3):
+        self.engine = engine
+        self.cookie_manager = cookie_manager
+        self.format_spec = format_spec  # Overrides the output-height selection when set
+        self.scheduler = scheduler or DownloadScheduler(max_connections=None, max_per_host=None)
+        self.retries = retries
+
+    def _call_params(self, deadline):
+        def sleep(n):
+            return deadline.backoff_delay(n + 1)
+        return {
+            'retries': self.retries,
+            'fragment_retries': self.retries,
+            'extractor_retries': self.retries,
+            'retry_sleep_functions': {'http': sleep, 'fragment': sleep, 'extractor': sleep},
+        }
+
+    def _progress(self, transfer, deadline):
+        throttle = transfer.ytdlp_progress()
+
+        def hook(progress):
+            deadline.check()
+            throttle(progress)
+        return hook
+
+    def download(self, video_id, output_path, height=None, deadline=None):
+        deadline = deadline or Deadline(None)
+        format_spec = self.format_spec or ytdlp_format_spec(height or DEFAULT_OUTPUT_HEIGHT)
+        params = self._call_params(deadline)
+        print(f"Starting yt-dlp download for video {video_id}")
+        # yt-dlp and its ffmpeg merge go by the file extension, so download to
+        # a .mp4 name in a private directory and move it to ``output_path``
+        staging = tempfile.mkdtemp(prefix='.ytdlp-', dir=os.path.dirname(output_path) or '.')
+        staged_path = os.path.join(staging, f"{video_id}.mp4")
+        try:
+            with self.scheduler.transfer(YOUTUBE_MEDIA_HOST, deadline) as transfer:
+                try:
+                    self.engine.download(f'https://www.youtube.com/watch?v={video_id}', staged_path, format_spec,
+                                         progress=self._progress(transfer, deadline), params=params)
+                except DeadlineExceeded:
+                    raise
+                except Exception as primary_error:
+                    if BOT_CHECK_MESSAGE in str(primary_error):
+                        self.cookie_manager.report_failure(str(primary_error))
+                    reason = video_error_reason(str(primary_error))
+                    if reason is not None and reason != 'age-restricted':
+                        raise VideoUnavailable(video_id, reason) from primary_error
+                    deadline.check()
+                    # The embed URL sometimes bypasses age restrictions
+                    print(f"Primary download failed: {str(primary_error)}, trying embed URL")
+                    try:
+                        self.engine.download(f'https://www.youtube.com/embed/{video_id}', staged_path, format_spec,
+                                             progress=self._progress(transfer, deadline), params=params)
+                    except DeadlineExceeded:
+                        raise
+                    except Exception as embed_error:
+                        reason = reason or video_error_reason(str(embed_error))
+                        if reason is not None:
+                            raise VideoUnavailable(video_id, reason) from embed_error
+                        raise
+            if not os.path.exists(staged_path) or os.path.getsize(staged_path) < MIN_VIDEO_BYTES:
+                raise ValueError(f"Download completed but file is missing or too small: {output_path}")
+            os.replace(staged_path, output_path)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        print(f"yt-dlp download finished for {video_id}")
+
+
+class LocalFileProvider(DownloadProvider):
+    """Copy ``<directory>/<video_id>.mp4``; for development and tests without network access."""
+
+    name = 'local'
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def download(self, video_id, output_path, height=None, deadline=None):
+        source = os.path.join(self.directory, f"{video_id}.mp4")
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"No local copy of {video_id} in {self.directory}")
+        shutil.copyfile(source, output_path)
+
+
+class ProviderHealth:
+    """Rolling outcomes of one provider and its circuit breaker.
+
+    The breaker opens after ``failure_threshold`` failures in a row and stays
+    open for ``reset_timeout`` seconds, doubling each time a trial request
+    fails, up to ``max_reset_timeout``. Once it has elapsed one trial request
+    is let through (half-open); its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, provider, window=20):
+        self.provider = provider
+        self.outcomes = deque(maxlen=window)  # (ok, seconds, bytes)
+        self.failure_streak = 0
+        self.open_until = 0.0
+        self.open_count = 0
+        self.trial_in_flight = False
+        self.last_error = None
+        self.attempts = 0
+        self.failures = 0
+        self.skipped = 0
+
+    @property
+    def success_rate(self):
+        if not self.outcomes:
+            return None
+        return sum(1 for ok, _, _ in self.outcomes if ok) / len(self.outcomes)
+
+    @property
+    def mean_seconds(self):
+        durations = [seconds for ok, seconds, _ in self.outcomes if ok]
+        return sum(durations) / len(durations) if durations else None
+
+    def state(self, now):
+        if self.open_until == 0.0:
+            return 'closed'
+        return 'open' if now < self.open_until or self.trial_in_flight else 'half-open'
+
+    def snapshot(self, now):
+        success_rate = self.success_rate
+        mean_seconds = self.mean_seconds
+        return {
+            'name': self.provider.name,
+            'state': self.state(now),
+            'successRate': round(success_rate, 3) if success_rate is not None else None,
+            'meanSeconds': round(mean_seconds, 2) if mean_seconds is not None else None,
+            'samples': len(self.outcomes),
+            'openForSeconds': round(max(self.open_until - now, 0.0), 1),
+            'attempts': self.attempts,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'lastError': self.last_error,
+        }
+
+
+class ProviderRouter:
+    """Try download providers fastest-first, skipping those whose circuit breaker is open.
+
+    A provider's expected cost is its mean download time over the recent
+    window divided by its success rate; providers without samples yet are
+    assumed to take ``initial_seconds`` and keep their configured order.
+    """
+
+    def __init__(self, providers, window=20, failure_threshold=3, reset_timeout=60, max_reset_timeout=900,
+                 initial_seconds=30):
+        if not providers:
+            raise ValueError("At least one download provider is required")
+        self.health = [ProviderHealth(provider, window) for provider in providers]
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.initial_seconds = initial_seconds
+        self._lock = threading.Lock()
+
+    def _expected_seconds(self, health):
+        mean_seconds = health.mean_seconds
+        success_rate = health.success_rate
+        if success_rate is None:
+            return self.initial_seconds
+        if mean_seconds is None:
+            mean_seconds = self.initial_seconds
+        return mean_seconds / max(success_rate, 0.05)
+
+    def plan(self):
+        """Providers to try, in order. Claims the half-open trial of any provider it includes."""
+        now = time.time()
+        with self._lock:
+            ranked = sorted(
+                enumerate(self.health),
+                key=lambda item: (self._expected_seconds(item[1]), item[0])
+            )
+            planned = []
+            for _, health in ranked:
+                state = health.state(now)
+                if state == 'open':
+                    health.skipped += 1
+                    continue
+                if state == 'half-open':
+                    health.trial_in_flight = True
+                planned.append(health)
+            return planned
+
+    def record(self, health, ok, seconds, size=0, error=None):
+        with self._lock:
+            health.attempts += 1
+            health.outcomes.append((ok, seconds, size))
+            was_trial = health.trial_in_flight
+            health.trial_in_flight = False
+            if ok:
+                health.failure_streak = 0
+                health.open_until = 0.0
+                health.open_count = 0
+                return
+            health.failures += 1
+            health.failure_streak += 1
+            health.last_error = error
+            if was_trial or health.failure_streak >= self.failure_threshold:
+                timeout = min(self.reset_timeout * 2 ** health.open_count, self.max_reset_timeout)
+                health.open_until = time.time() + timeout
+                health.open_count += 1
+                print(f"[WARNING] Download provider {health.provider.name} circuit open for {timeout:.0f}s")
+
+    def settle(self, health):
+        """End an attempt that says nothing about the provider, e.g. the video itself was at fault."""
+        with self._lock:
+            health.trial_in_flight = False
+
+    def download(self, video_id, output_path, validate=None, height=None, deadline=None):
+        """Download a video with the first provider that succeeds and return that provider's name.
+
+        ``height`` is passed on to the providers to choose a stream. Once
+        ``deadline`` runs out no further provider is tried, and a provider
+        stopped by it is not counted as failing. ``validate`` is called with
+        the downloaded path and ``deadline`` and should raise if the file is unusable; the
+        next provider is then tried, but a bad source is not held against
+        the provider that fetched it, nor is a provider declining with
+        ProviderUnavailable. A provider reporting the video as
+        private, removed or age-restricted ends the download with
+        VideoUnavailable, again without counting against it.
+        """
+        deadline = deadline or Deadline(None)
+        deadline.check()
+        planned = self.plan()
+        if not planned:
+            raise DownloadFailed(f"All download providers are unavailable (circuit open) for video {video_id}")
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        errors = []
+        remaining = list(planned)
+        try:
+            while remaining:
+                health = remaining.pop(0)
+                name = health.provider.name
+                started = time.time()
+                try:
+                    deadline.check()
+                    print(f"Attempting download via {name} for video {video_id}")
+                    health.provider.download(video_id, output_path, height=height, deadline=deadline)
+                    if not os.path.exists(output_path) or os.path.getsize(output_path) < MIN_VIDEO_BYTES:
+                        raise ValueError(f"Downloaded file is missing or too small: {output_path}")
+                    if validate is not None:
+                        try:
+                            validate(output_path, deadline=deadline)
+                        except DeadlineExceeded:
+                            raise
+                        except Exception as e:
+                            raise InvalidSource(str(e)) from e
+                except DeadlineExceeded:
+                    print(f"{name} download of {video_id} stopped at the job deadline after {time.time() - started:.1f}s")
+                    remaining.insert(0, health)
+                    remove_partial(output_path)
+                    raise
+                except VideoUnavailable as e:
+                    print(f"{name}: {str(e)}")
+                    self.settle(health)
+                    remove_partial(output_path)
+                    raise
+                except ProviderUnavailable as e:
+                    print(f"{name} declined {video_id}: {str(e)}")
+                    self.settle(health)
+                    errors.append(f"{name} error: {e}")
+                    remove_partial(output_path)
+                    continue
+                except InvalidSource as e:
+                    print(f"{name} downloaded an unusable file for {video_id}: {str(e)}")
+                    self.settle(health)
+                    errors.append(f"{name} error: {e}")
+                    remove_partial(output_path)
+                    continue
+                except Exception as e:
+                    seconds = time.time() - started
+                    print(f"{name} download failed after {seconds:.1f}s: {str(e)}")
+                    self.record(health, False, seconds, error=str(e))
+                    errors.append(f"{name} error: {e}")
+                    remove_partial(output_path)
+                    continue
+                self.record(health, True, time.time() - started, os.path.getsize(output_path))
+                return name
+        finally:
+            # Half-open trials claimed for providers this download never reached
+            self._release_trials(remaining)
+        raise DownloadFailed(f"All download methods failed for video {video_id}. " + ', '.join(errors))
+
+    def _release_trials(self, unused):
+        with self._lock:
+            for health in unused:
+                health.trial_in_flight = False
+
+    def snapshot(self):
+        now = time.time()
+        with self._lock:
+            ranked = sorted(enumerate(self.health), key=lambda item: (self._expected_seconds(item[1]), item[0]))
+            return [health.snapshot(now) for _, health in ranked]
+
+
+def remove_partial(output_path):
+    for path in (output_path, f"{output_path}.part"):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            print(f"Warning: Failed to remove partial download {path}: {e}")
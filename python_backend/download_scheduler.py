@@ -0,0 +1,218 @@
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+# Host key for yt-dlp downloads, whose media URLs are only known inside yt-dlp
+YOUTUBE_MEDIA_HOST = 'googlevideo.com'
+
+
+def host_key(url):
+    """Registered domain of ``url`` (``rr3---sn-abc.googlevideo.com`` -> ``googlevideo.com``)."""
+    host = urlsplit(url).hostname or url
+    return '.'.join(host.split('.')[-2:])
+
+
+class TokenBucket:
+    """Byte-rate limit shared by every transfer in the process.
+
+    ``consume`` takes tokens as bytes arrive and sleeps off any deficit, so
+    throughput averages ``rate`` bytes per second with bursts of up to
+    ``burst`` bytes. While an interactive consumer is waiting for tokens,
+    background consumers wait behind it. A ``rate`` of 0 disables the limit.
+    A consumer with a ``deadline`` waits no longer than it has left and
+    then raises DeadlineExceeded.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._interactive_waiting = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, amount, background=False, deadline=None):
+        if not self.rate:
+            return
+        with self._cond:
+            while background and self._interactive_waiting:
+                self._cond.wait(deadline.timeout() if deadline is not None else None)
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return
+            delay = -self.tokens / self.rate
+            if not background:
+                self._interactive_waiting += 1
+        try:
+            time.sleep(deadline.timeout(delay) if deadline is not None else delay)
+            if deadline is not None:
+                deadline.check()
+        finally:
+            if not background:
+                with self._cond:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+
+
+class _Transfer:
+    def __init__(self, scheduler, host, priority, deadline=None):
+        self.scheduler = scheduler
+        self.host = host
+        self.priority = priority
+        self.deadline = deadline
+        self.bytes = 0
+
+    def consume(self, amount):
+        """Account for ``amount`` bytes received, sleeping if the bandwidth cap is exceeded."""
+        self.bytes += amount
+        self.scheduler._received(amount)
+        self.scheduler.bucket.consume(amount, background=self.priority == BACKGROUND, deadline=self.deadline)
+
+    def ytdlp_progress(self):
+        """A yt-dlp progress hook that feeds this transfer's bytes to the bandwidth cap."""
+        seen = {}
+
+        def hook(progress):
+            if progress.get('status') != 'downloading':
+                return
+            key = progress.get('filename')
+            done = progress.get('downloaded_bytes') or 0
+            delta = done - seen.get(key, 0)
+            seen[key] = done
+            if delta > 0:
+                self.consume(delta)
+        return hook
+
+
+class DownloadScheduler:
+    """Connection and bandwidth limits shared by every outbound video download in the process.
+
+    A transfer first takes a connection slot: at most ``max_connections``
+    at once, and at most ``max_per_host`` to one registered domain (None
+    for no limit). Waiting
+    interactive transfers (merges) get slots before background ones
+    (prefetches, Whisper audio), otherwise first come first served; a
+    waiter whose host is full does not hold up waiters for other hosts.
+    Bytes received then pass through a ``TokenBucket`` of
+    ``bandwidth`` bytes per second.
+
+    The priority of transfers started in a thread is set with
+    ``background()``. Pass another scheduler's ``bucket`` to keep separate
+    connection budgets under one bandwidth cap.
+    """
+
+    def __init__(self, max_connections=4, max_per_host=2, bandwidth=0, burst=None, window=10, bucket=None):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.bucket = bucket or TokenBucket(bandwidth, burst)
+        self.window = window
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiters = []
+        self._active = {}
+        self._local = threading.local()
+        self._samples = deque()
+        self.bytes_total = 0
+        self.transfers = 0
+        self.wait_seconds = 0.0
+
+    @contextmanager
+    def background(self):
+        """Run transfers started in this block at background priority."""
+        previous = getattr(self._local, 'priority', INTERACTIVE)
+        self._local.priority = BACKGROUND
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    @contextmanager
+    def transfer(self, url, deadline=None):
+        """Hold a connection slot to ``url``'s host for the duration of the block.
+
+        With a ``deadline`` (a Deadline) the wait for a slot, and for
+        bandwidth tokens within the block, raises DeadlineExceeded once it
+        runs out.
+        """
+        host = host_key(url)
+        priority = getattr(self._local, 'priority', INTERACTIVE)
+        waiter = (priority == BACKGROUND, next(self._seq), host)
+        started = time.time()
+        with self._cond:
+            self._waiters.append(waiter)
+            self._waiters.sort()
+            try:
+                while not self._may_start(waiter):
+                    self._cond.wait(deadline.timeout() if deadline is not None else None)
+            finally:
+                self._waiters.remove(waiter)
+            self._active[host] = self._active.get(host, 0) + 1
+            self.transfers += 1
+            self.wait_seconds += time.time() - started
+        waited = time.time() - started
+        if waited > 1:
+            print(f"[INFO] Waited {waited:.1f}s for a {priority} download slot to {host}")
+        try:
+            yield _Transfer(self, host, priority, deadline)
+        finally:
+            with self._cond:
+                self._active[host] -= 1
+                if not self._active[host]:
+                    del self._active[host]
+                self._cond.notify_all()
+
+    def _may_start(self, waiter):
+        active = dict(self._active)
+        total = sum(active.values())
+        for other in self._waiters:
+            if self.max_connections is not None and total >= self.max_connections:
+                return False
+            if self.max_per_host is not None and active.get(other[2], 0) >= self.max_per_host:
+                continue
+            if other is waiter:
+                return True
+            # An earlier waiter will take this slot
+            active[other[2]] = active.get(other[2], 0) + 1
+            total += 1
+        return False
+
+    def _received(self, amount):
+        now = time.time()
+        with self._cond:
+            self.bytes_total += amount
+            self._samples.append((now, amount))
+            while self._samples and self._samples[0][0] < now - self.window:
+                self._samples.popleft()
+
+    def snapshot(self):
+        now = time.time()
+        with self._cond:
+            while self._samples and self._samples[0][0] < now - self.window:
+                self._samples.popleft()
+            throughput = sum(amount for _, amount in self._samples) / self.window
+            return {
+                'activeConnections': sum(self._active.values()),
+                'maxConnections': self.max_connections,
+                'maxPerHost': self.max_per_host,
+                'hosts': dict(self._active),
+                'waiting': {
+                    INTERACTIVE: sum(1 for waiter in self._waiters if not waiter[0]),
+                    BACKGROUND: sum(1 for waiter in self._waiters if waiter[0]),
+                },
+                'bandwidthLimit': self.bucket.rate or None,
+                'throughput': round(throughput),
+                'utilization': round(throughput / self.bucket.rate, 3) if self.bucket.rate else None,
+                'bytesTotal': self.bytes_total,
+                'transfers': self.transfers,
+                'meanWaitSeconds': round(self.wait_seconds / self.transfers, 2) if self.transfers else None,
+            }
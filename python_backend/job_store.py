@@ -0,0 +1,377 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import uuid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    priority_rank INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    virtual_start REAL NOT NULL,
+    virtual_finish REAL NOT NULL,
+    spec TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    lease_owner TEXT,
+    lease_expires_at REAL,
+    heartbeat_at REAL,
+    status_code INTEGER,
+    result TEXT,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority_rank, virtual_finish, seq);
+CREATE INDEX IF NOT EXISTS jobs_lease ON jobs (status, lease_expires_at);
+
+CREATE TABLE IF NOT EXISTS fair_share (
+    priority TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    last_finish REAL NOT NULL,
+    PRIMARY KEY (priority, owner)
+);
+
+CREATE TABLE IF NOT EXISTS virtual_clock (
+    priority TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    ttl REAL NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    slots INTEGER NOT NULL,
+    kind TEXT NOT NULL DEFAULT 'merge',
+    heartbeat_at REAL NOT NULL
+);
+"""
+
+FINISHED_STATUSES = ('completed', 'failed')
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an Idempotency-Key is reused with a different request body."""
+
+
+class JobStore:
+    """Durable job table shared by every API and worker process.
+
+    The default backend is a SQLite file; put it on a shared volume to let
+    several hosts claim work from the same queue. Workers take a time-limited
+    lease on the job they claim and extend it with heartbeats. A job whose
+    lease expires (the worker crashed or was restarted) is handed to the next
+    worker that claims, up to ``max_attempts`` times.
+
+    Queue order is priority rank, then weighted fair queuing tag, then
+    submission order. The per-owner tags live in the database as well so the
+    fair share holds across processes.
+    """
+
+    def __init__(self, path, retention=3600, max_attempts=3):
+        self.path = path
+        self.retention = retention
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = [row['name'] for row in conn.execute("PRAGMA table_info(workers)").fetchall()]
+            if 'kind' not in columns:
+                conn.execute("ALTER TABLE workers ADD COLUMN kind TEXT NOT NULL DEFAULT 'merge'")
+            columns = [row['name'] for row in conn.execute("PRAGMA table_info(idempotency_keys)").fetchall()]
+            if 'ttl' not in columns:
+                conn.execute("ALTER TABLE idempotency_keys ADD COLUMN ttl REAL NOT NULL DEFAULT 0")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return _Transaction(conn)
+
+    def enqueue(self, kind, spec, owner, priority, priority_rank, cost, weight=1.0,
+                idempotency_key=None, fingerprint=None, idempotency_window=0):
+        """Insert a queued job and return ``(job, created)``.
+
+        With an idempotency key, a job submitted under the same key is
+        returned instead (``created`` is False) while it is queued or running
+        and for ``idempotency_window`` seconds after it finished, unless it
+        failed, in which case a fresh job is queued. Each key keeps the
+        window it was submitted with.
+        """
+        now = time.time()
+        job_id = str(uuid.uuid4())
+        cost = max(float(cost), 0.001)
+
+        with self._connect() as conn:
+            conn.begin_immediate()
+            if idempotency_key:
+                self._purge_idempotency_keys(conn, now)
+                existing = conn.execute(
+                    "SELECT k.fingerprint, j.* FROM idempotency_keys k JOIN jobs j ON j.id = k.job_id WHERE k.key = ?",
+                    (idempotency_key,)
+                ).fetchone()
+                if existing is not None:
+                    if existing['fingerprint'] != fingerprint:
+                        raise IdempotencyConflict(
+                            f"Idempotency key {idempotency_key} was already used with a different request body"
+                        )
+                    if existing['status'] != 'failed':
+                        return _row_to_job(existing), False
+                    conn.execute("DELETE FROM idempotency_keys WHERE key = ?", (idempotency_key,))
+
+            clock = conn.execute("SELECT value FROM virtual_clock WHERE priority = ?", (priority,)).fetchone()
+            last_finish = conn.execute(
+                "SELECT last_finish FROM fair_share WHERE priority = ? AND owner = ?", (priority, owner)
+            ).fetchone()
+            virtual_start = max(clock['value'] if clock else 0.0, last_finish['last_finish'] if last_finish else 0.0)
+            virtual_finish = virtual_start + cost / weight
+
+            conn.execute(
+                "INSERT INTO jobs (id, kind, owner, priority, priority_rank, cost, virtual_start, virtual_finish, "
+                "spec, status, max_attempts, submitted_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, owner, priority, priority_rank, cost, virtual_start, virtual_finish,
+                 json.dumps(spec), self.max_attempts, now)
+            )
+            conn.execute(
+                "INSERT INTO fair_share (priority, owner, last_finish) VALUES (?, ?, ?) "
+                "ON CONFLICT (priority, owner) DO UPDATE SET last_finish = excluded.last_finish",
+                (priority, owner, virtual_finish)
+            )
+            if idempotency_key:
+                conn.execute(
+                    "INSERT INTO idempotency_keys (key, fingerprint, job_id, created_at, ttl) VALUES (?, ?, ?, ?, ?)",
+                    (idempotency_key, fingerprint, job_id, now, idempotency_window)
+                )
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row), True
+
+    def _purge_idempotency_keys(self, conn, now):
+        # Keys of unfinished jobs never expire; keys whose job was deleted do
+        conn.execute(
+            "DELETE FROM idempotency_keys WHERE NOT EXISTS (SELECT 1 FROM jobs j WHERE j.id = idempotency_keys.job_id "
+            "AND (j.finished_at IS NULL OR j.finished_at + idempotency_keys.ttl >= ?))",
+            (now,)
+        )
+
+    def claim(self, worker_id, lease_seconds, kinds=None):
+        """Lease the next queued job to ``worker_id``, or return None if the queue is empty."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.begin_immediate()
+            self._release_expired_leases(conn, now)
+
+            query = "SELECT * FROM jobs WHERE status = 'queued'"
+            params = []
+            if kinds:
+                query += f" AND kind IN ({', '.join('?' for _ in kinds)})"
+                params.extend(kinds)
+            query += " ORDER BY priority_rank, virtual_finish, seq LIMIT 1"
+            row = conn.execute(query, params).fetchone()
+            if row is None:
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET status = 'running', lease_owner = ?, lease_expires_at = ?, heartbeat_at = ?, "
+                "attempts = attempts + 1, started_at = ? WHERE id = ?",
+                (worker_id, now + lease_seconds, now, now, row['id'])
+            )
+            conn.execute(
+                "INSERT INTO virtual_clock (priority, value) VALUES (?, ?) "
+                "ON CONFLICT (priority) DO UPDATE SET value = MAX(value, excluded.value)",
+                (row['priority'], row['virtual_start'])
+            )
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone()
+        return _row_to_job(row)
+
+    def _release_expired_leases(self, conn, now):
+        expired = conn.execute(
+            "SELECT id, attempts, max_attempts, lease_owner FROM jobs WHERE status = 'running' AND lease_expires_at < ?",
+            (now,)
+        ).fetchall()
+        for row in expired:
+            if row['attempts'] < row['max_attempts']:
+                print(f"Lease on job {row['id']} held by {row['lease_owner']} expired, re-queueing")
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', lease_owner = NULL, lease_expires_at = NULL WHERE id = ?",
+                    (row['id'],)
+                )
+            else:
+                print(f"Job {row['id']} lost its worker {row['attempts']} times, giving up")
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', status_code = 500, result = ?, finished_at = ?, "
+                    "lease_owner = NULL, lease_expires_at = NULL WHERE id = ?",
+                    (json.dumps({'error': 'Job was abandoned by its worker too many times', 'status': False}),
+                     now, row['id'])
+                )
+
+        conn.execute(
+            f"DELETE FROM jobs WHERE status IN ({', '.join('?' for _ in FINISHED_STATUSES)}) AND finished_at < ?",
+            (*FINISHED_STATUSES, now - self.retention)
+        )
+
+    def heartbeat(self, job_id, worker_id, lease_seconds):
+        """Extend the lease on a running job. Returns False if the lease was lost."""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires_at = ?, heartbeat_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                (now + lease_seconds, now, job_id, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id, worker_id, payload, status_code):
+        """Store the result of a job. Ignored if another worker has taken over the lease."""
+        status = 'completed' if status_code < 400 else 'failed'
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, status_code = ?, result = ?, finished_at = ?, "
+                "lease_owner = NULL, lease_expires_at = NULL WHERE id = ? AND lease_owner = ?",
+                (status, status_code, json.dumps(payload), time.time(), job_id, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def queue_position(self, job):
+        """1-based position among queued jobs of the same kind, or 0 once the job has started."""
+        if job['status'] != 'queued':
+            return 0
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) AS ahead FROM jobs WHERE status = 'queued' AND kind = ? AND "
+                "(priority_rank < ? OR (priority_rank = ? AND "
+                "(virtual_finish < ? OR (virtual_finish = ? AND seq < ?))))",
+                (job['kind'], job['priorityRank'], job['priorityRank'], job['virtualFinish'], job['virtualFinish'], job['seq'])
+            ).fetchone()
+        return row['ahead'] + 1
+
+    def backlog(self, job=None, kind='merge'):
+        """Estimated seconds of work queued ahead of ``job`` (or all queued work of ``kind``) plus work still running."""
+        now = time.time()
+        if job is not None:
+            kind = job['kind']
+        with self._connect() as conn:
+            running = conn.execute(
+                "SELECT COALESCE(SUM(MAX(cost - (? - started_at), 0)), 0) AS remaining FROM jobs "
+                "WHERE status = 'running' AND kind = ?",
+                (now, kind)
+            ).fetchone()['remaining']
+            if job is None:
+                queued = conn.execute(
+                    "SELECT COALESCE(SUM(cost), 0) AS total FROM jobs WHERE status = 'queued' AND kind = ?", (kind,)
+                ).fetchone()['total']
+            elif job['status'] != 'queued':
+                queued = 0.0
+            else:
+                queued = conn.execute(
+                    "SELECT COALESCE(SUM(cost), 0) AS total FROM jobs WHERE status = 'queued' AND kind = ? AND "
+                    "(priority_rank < ? OR (priority_rank = ? AND "
+                    "(virtual_finish < ? OR (virtual_finish = ? AND seq < ?))))",
+                    (kind, job['priorityRank'], job['priorityRank'], job['virtualFinish'], job['virtualFinish'], job['seq'])
+                ).fetchone()['total']
+        return queued + running
+
+    def queue_length(self, kind='merge'):
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) AS n FROM jobs WHERE status = 'queued' AND kind = ?", (kind,)
+            ).fetchone()['n']
+
+    def active_jobs(self, kind='merge'):
+        """Number of ``kind`` jobs queued or running."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) AS n FROM jobs WHERE status IN ('queued', 'running') AND kind = ?", (kind,)
+            ).fetchone()['n']
+
+    def register_worker(self, worker_id, host, slots, kind='merge'):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO workers (id, host, slots, kind, heartbeat_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET slots = excluded.slots, heartbeat_at = excluded.heartbeat_at",
+                (worker_id, host, slots, kind, time.time())
+            )
+
+    def active_slots(self, max_age, kind='merge'):
+        """Slots for ``kind`` jobs of workers that have checked in within ``max_age`` seconds."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM workers WHERE heartbeat_at < ?", (time.time() - 10 * max_age,))
+            return conn.execute(
+                "SELECT COALESCE(SUM(slots), 0) AS slots FROM workers WHERE heartbeat_at >= ? AND kind = ?",
+                (time.time() - max_age, kind)
+            ).fetchone()['slots']
+
+
+class _Transaction:
+    """Context manager that commits on success, rolls back on error and always closes."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def begin_immediate(self):
+        # Take the write lock up front so read-then-write sequences are atomic
+        self.conn.execute("BEGIN IMMEDIATE")
+
+    def execute(self, *args):
+        return self.conn.execute(*args)
+
+    def executescript(self, script):
+        return self.conn.executescript(script)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.conn.in_transaction:
+                self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.conn.close()
+        return False
+
+
+def request_fingerprint(data):
+    """Stable hash of a JSON request body, independent of key order."""
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _row_to_job(row):
+    return {
+        'id': row['id'],
+        'seq': row['seq'],
+        'kind': row['kind'],
+        'owner': row['owner'],
+        'priority': row['priority'],
+        'priorityRank': row['priority_rank'],
+        'cost': row['cost'],
+        'virtualFinish': row['virtual_finish'],
+        'spec': json.loads(row['spec']),
+        'status': row['status'],
+        'attempts': row['attempts'],
+        'leaseOwner': row['lease_owner'],
+        'heartbeatAt': row['heartbeat_at'],
+        'statusCode': row['status_code'],
+        'result': json.loads(row['result']) if row['result'] else None,
+        'submittedAt': row['submitted_at'],
+        'startedAt': row['started_at'],
+        'finishedAt': row['finished_at'],
+    }
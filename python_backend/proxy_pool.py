@@ -0,0 +1,169 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class ProxyUnavailable(Exception):
+    """Raised when no proxy frees up within the pool's wait timeout."""
+
+
+class ProxyEndpoint:
+    """One proxy exit and its health: success rate and latency EWMAs, load and cooldown."""
+
+    def __init__(self, name, proxy_config, max_concurrency=4):
+        self.name = name
+        self.proxy_config = proxy_config
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.success_rate = 1.0
+        self.latency_ms = None
+        self.cooldown_until = 0.0
+        self.throttle_streak = 0
+        self.failure_streak = 0
+        self.requests = 0
+        self.failures = 0
+        self.throttled = 0
+
+    def snapshot(self, now):
+        return {
+            'name': self.name,
+            'inFlight': self.in_flight,
+            'maxConcurrency': self.max_concurrency,
+            'successRate': round(self.success_rate, 3),
+            'latencyMs': round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            'coolingDownSeconds': round(max(self.cooldown_until - now, 0.0), 1),
+            'requests': self.requests,
+            'failures': self.failures,
+            'throttled': self.throttled,
+        }
+
+
+class ProxyPool:
+    """Route requests to the healthiest of several proxy endpoints.
+
+    An endpoint's score is its success rate divided by its latency EWMA,
+    discounted by how many of its slots are in use; endpoints with no
+    samples yet start at ``initial_latency_ms`` so they get tried. Each
+    endpoint takes at most ``max_concurrency`` requests at once.
+
+    A throttled request (YouTube blocking the exit IP) puts the endpoint in
+    cooldown for ``cooldown`` seconds, doubling with every consecutive
+    throttle up to ``max_cooldown``; ``failures_before_cooldown`` failures in
+    a row (connection errors, timeouts) cool it down too. When every
+    endpoint is cooling down, the one that recovers first is used as a probe
+    rather than failing the request outright.
+    """
+
+    def __init__(self, endpoints, alpha=0.2, cooldown=30, max_cooldown=900, failures_before_cooldown=3,
+                 wait_timeout=30, initial_latency_ms=1000):
+        if not endpoints:
+            raise ValueError("A proxy pool needs at least one endpoint")
+        self.endpoints = list(endpoints)
+        self.alpha = alpha
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures_before_cooldown = failures_before_cooldown
+        self.wait_timeout = wait_timeout
+        self.initial_latency_ms = initial_latency_ms
+        self._condition = threading.Condition()
+
+    @property
+    def capacity(self):
+        return sum(endpoint.max_concurrency for endpoint in self.endpoints)
+
+    def _score(self, endpoint):
+        latency = endpoint.latency_ms if endpoint.latency_ms is not None else self.initial_latency_ms
+        load = 1 + endpoint.in_flight / endpoint.max_concurrency
+        return endpoint.success_rate / (max(latency, 1.0) * load)
+
+    def acquire(self, exclude=()):
+        """Reserve a slot on the best endpoint not in ``exclude`` and return it.
+
+        Blocks while every usable endpoint is at its concurrency cap. Must be
+        paired with ``release``.
+        """
+        deadline = time.time() + self.wait_timeout
+        with self._condition:
+            while True:
+                now = time.time()
+                usable = [e for e in self.endpoints if e not in exclude]
+                if not usable:
+                    raise ProxyUnavailable("No proxy left to try")
+                free = [e for e in usable if e.in_flight < e.max_concurrency]
+                ready = [e for e in free if e.cooldown_until <= now]
+                if ready:
+                    chosen = max(ready, key=self._score)
+                elif free and all(e.cooldown_until > now for e in usable):
+                    chosen = min(free, key=lambda e: e.cooldown_until)
+                else:
+                    chosen = None
+
+                if chosen is not None:
+                    chosen.in_flight += 1
+                    chosen.requests += 1
+                    return chosen
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise ProxyUnavailable(f"All proxies busy for {self.wait_timeout}s")
+                self._condition.wait(remaining)
+
+    def acquire_endpoint(self, endpoint):
+        """Reserve a slot on a specific endpoint, e.g. the one a cached listing is bound to."""
+        deadline = time.time() + self.wait_timeout
+        with self._condition:
+            while endpoint.in_flight >= endpoint.max_concurrency:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise ProxyUnavailable(f"Proxy {endpoint.name} busy for {self.wait_timeout}s")
+                self._condition.wait(remaining)
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint, ok, latency_ms=None, throttled=False):
+        """Return a slot and fold the outcome into the endpoint's health."""
+        with self._condition:
+            endpoint.in_flight -= 1
+            endpoint.success_rate = (1 - self.alpha) * endpoint.success_rate + self.alpha * (1.0 if ok else 0.0)
+            now = time.time()
+            if ok:
+                endpoint.throttle_streak = 0
+                endpoint.failure_streak = 0
+                if latency_ms is not None:
+                    endpoint.latency_ms = latency_ms if endpoint.latency_ms is None else (
+                        (1 - self.alpha) * endpoint.latency_ms + self.alpha * latency_ms
+                    )
+            else:
+                endpoint.failures += 1
+                endpoint.failure_streak += 1
+                if throttled:
+                    endpoint.throttled += 1
+                    endpoint.throttle_streak += 1
+                    backoff = min(self.cooldown * 2 ** (endpoint.throttle_streak - 1), self.max_cooldown)
+                    endpoint.cooldown_until = now + backoff
+                    print(f"[WARNING] Proxy {endpoint.name} throttled, cooling down for {backoff:.0f}s")
+                elif endpoint.failure_streak >= self.failures_before_cooldown:
+                    endpoint.cooldown_until = now + self.cooldown
+                    print(f"[WARNING] Proxy {endpoint.name} failed {endpoint.failure_streak} times in a row, "
+                          f"cooling down for {self.cooldown}s")
+            self._condition.notify_all()
+
+    def next_ready_in(self):
+        """Seconds until some endpoint is out of cooldown; 0 if one is ready now."""
+        now = time.time()
+        with self._condition:
+            return max(min(endpoint.cooldown_until for endpoint in self.endpoints) - now, 0.0)
+
+    def snapshot(self):
+        now = time.time()
+        with self._condition:
+            return [endpoint.snapshot(now) for endpoint in self.endpoints]
+
+
+def proxy_name(url):
+    """Display name for a proxy URL, without its credentials."""
+    if url == 'direct':
+        return 'direct'
+    parts = urlsplit(url)
+    return f"{parts.hostname}:{parts.port}" if parts.port else (parts.hostname or url)
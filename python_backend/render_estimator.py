@@ -0,0 +1,202 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent writers may lose each other's updates
+    fcntl = None
+
+DEFAULT_PROFILE = 'libx264-medium'
+DEFAULT_HEIGHT = 720
+RESOLUTION_BUCKETS = [360, 480, 720, 1080, 1440, 2160]
+
+# Trimming with -ss after -i decodes everything before the start point. Decoding
+# is roughly an order of magnitude cheaper than encoding, so each second of
+# source before the clip counts as this fraction of an encoded second.
+SEEK_DECODE_FACTOR = 0.1
+
+# Priors used until enough jobs have been recorded
+DEFAULT_RATES = {
+    'download_seconds_per_video': 20.0,
+    'encode_seconds_per_unit': 0.5,
+    'concat_seconds_per_output_second': 0.3,
+    'upload_seconds_per_output_second': 0.05,
+}
+
+
+def resolution_bucket(height):
+    if not height:
+        height = DEFAULT_HEIGHT
+    for bucket in RESOLUTION_BUCKETS:
+        if height <= bucket:
+            return bucket
+    return RESOLUTION_BUCKETS[-1]
+
+
+def encode_units(clip_seconds, start_time):
+    return clip_seconds + SEEK_DECODE_FACTOR * max(start_time, 0.0)
+
+
+class RenderEstimator:
+    """Predict merge duration per stage from timings of previously completed jobs.
+
+    Each stage keeps an exponentially weighted moving average of its cost rate:
+    download seconds per uncached source video, encode seconds per unit of
+    trimmed video (keyed by encode profile and source resolution), and concat /
+    upload seconds per second of output. Rates are persisted to a JSON file so
+    estimates survive restarts.
+
+    Every API and worker process shares the file: it is read again whenever
+    it changed on disk, and a process recording a job folds its
+    observations into the file's current rates under an exclusive lock, so
+    writers do not overwrite each other.
+    """
+
+    def __init__(self, stats_path, alpha=0.2):
+        self.stats_path = stats_path
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._rates = {}
+        self._samples = {}
+        self._version = None
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        """Read the stats file if it changed since it was last read. Call with ``_lock`` held."""
+        if not self.stats_path:
+            return
+        try:
+            stat = os.stat(self.stats_path)
+        except FileNotFoundError:
+            return
+        version = (stat.st_mtime_ns, stat.st_size)
+        if version == self._version:
+            return
+        try:
+            with open(self.stats_path, 'r') as f:
+                stored = json.load(f)
+            self._rates = stored.get('rates', {})
+            self._samples = stored.get('samples', {})
+            if self._version is None:
+                print(f"Loaded render timing stats from {self.stats_path}")
+            self._version = version
+        except Exception as e:
+            print(f"Error loading render timing stats: {str(e)}")
+
+    @contextmanager
+    def _file_lock(self):
+        if not self.stats_path or fcntl is None:
+            yield
+            return
+        with open(f"{self.stats_path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save(self):
+        """Write the stats file. Call with ``_lock`` and the file lock held."""
+        if not self.stats_path:
+            return
+        tmp_path = f"{self.stats_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'rates': self._rates, 'samples': self._samples, 'updatedAt': time.time()}, f)
+            os.replace(tmp_path, self.stats_path)
+            stat = os.stat(self.stats_path)
+            self._version = (stat.st_mtime_ns, stat.st_size)
+        except Exception as e:
+            print(f"Error saving render timing stats: {str(e)}")
+
+    def _rate(self, key, default):
+        return self._rates.get(key, default)
+
+    def _encode_rate(self, profile, height):
+        bucket = resolution_bucket(height)
+        key = f"encode:{profile}@{bucket}p"
+        if key in self._rates:
+            return self._rates[key]
+        # Unseen resolution: scale the 720p rate by pixel count
+        base = self._rates.get(f"encode:{profile}@{DEFAULT_HEIGHT}p", DEFAULT_RATES['encode_seconds_per_unit'])
+        return base * (bucket / DEFAULT_HEIGHT) ** 2
+
+    def _observe(self, key, value):
+        if key in self._rates:
+            self._rates[key] += self.alpha * (value - self._rates[key])
+        else:
+            self._rates[key] = value
+        self._samples[key] = self._samples.get(key, 0) + 1
+
+    def estimate(self, clips, cached_video_ids=(), heights=None, profile=DEFAULT_PROFILE):
+        """Estimate seconds per stage for merging ``clips``.
+
+        ``cached_video_ids`` are sources already on disk, ``heights`` maps video
+        IDs to their known vertical resolution.
+        """
+        heights = heights or {}
+        cached_video_ids = set(cached_video_ids)
+        with self._lock:
+            self._load()
+            video_ids = {clip.get('videoId') for clip in clips if clip.get('videoId')}
+            uncached = video_ids - cached_video_ids
+            download = len(uncached) * self._rate('download_seconds_per_video', DEFAULT_RATES['download_seconds_per_video'])
+
+            encode = 0.0
+            output_seconds = 0.0
+            for clip in clips:
+                start_time = float(clip.get('startTime', 0))
+                clip_seconds = max(float(clip.get('endTime', 0)) - start_time, 0.0)
+                output_seconds += clip_seconds
+                encode += encode_units(clip_seconds, start_time) * self._encode_rate(profile, heights.get(clip.get('videoId')))
+
+            concat = output_seconds * self._rate('concat_seconds_per_output_second', DEFAULT_RATES['concat_seconds_per_output_second'])
+            upload = output_seconds * self._rate('upload_seconds_per_output_second', DEFAULT_RATES['upload_seconds_per_output_second'])
+            samples = sum(self._samples.values())
+
+        stages = {
+            'download': round(download, 2),
+            'encode': round(encode, 2),
+            'concat': round(concat, 2),
+            'upload': round(upload, 2),
+        }
+        return {
+            'stages': stages,
+            'totalSeconds': round(sum(stages.values()), 2),
+            'outputSeconds': round(output_seconds, 2),
+            'uncachedVideos': sorted(uncached),
+            'cachedVideos': sorted(video_ids & cached_video_ids),
+            'profile': profile,
+            'basedOnSamples': samples,
+        }
+
+    def record(self, timings):
+        """Fold the stage timings of a finished merge into the running rates.
+
+        ``timings`` has the shape built by ``merge_clips``: ``downloads`` (list of
+        ``{'seconds'}``), ``clips`` (list of ``{'seconds', 'clipSeconds',
+        'startTime', 'height'}``), ``concat`` and ``upload`` (``{'seconds',
+        'outputSeconds'}``) and ``profile``.
+        """
+        profile = timings.get('profile', DEFAULT_PROFILE)
+        with self._lock, self._file_lock():
+            self._load()
+            for download in timings.get('downloads', []):
+                self._observe('download_seconds_per_video', download['seconds'])
+
+            for clip in timings.get('clips', []):
+                units = encode_units(clip['clipSeconds'], clip.get('startTime', 0.0))
+                if units > 0:
+                    key = f"encode:{profile}@{resolution_bucket(clip.get('height'))}p"
+                    self._observe(key, clip['seconds'] / units)
+
+            for stage in ('concat', 'upload'):
+                stage_timing = timings.get(stage)
+                if stage_timing and stage_timing.get('outputSeconds', 0) > 0:
+                    self._observe(f"{stage}_seconds_per_output_second", stage_timing['seconds'] / stage_timing['outputSeconds'])
+
+            self._save()
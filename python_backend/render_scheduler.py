@@ -0,0 +1,193 @@
+import math
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+
+# Lower rank is served first. Interactive previews always go ahead of exports;
+# within a class, owners share the render slots by weighted fair queuing.
+PRIORITY_CLASSES = {
+    'preview': 0,
+    'final': 1,
+}
+DEFAULT_PRIORITY = 'final'
+
+
+class RenderScheduler:
+    """Submit render jobs to the shared JobStore and run them on worker threads.
+
+    Jobs are dispatched strictly by priority class, then by weighted fair
+    queuing tag within the class: each job's virtual finish time is
+    ``max(class virtual clock, owner's last finish) + cost / weight``, where
+    cost is the job's estimated render seconds, so an owner with many queued
+    jobs only gets their share of the slots instead of starving everyone who
+    submitted after them.
+
+    Any process may submit jobs; only processes that call ``start()`` run
+    them, and only jobs of the scheduler's ``kind``. Each running job holds a lease in the store that is renewed every
+    ``lease_seconds / 3`` seconds, so jobs of a crashed worker are picked up
+    again by the surviving ones.
+    """
+
+    def __init__(self, store, run_fn, workers=2, owner_weights=None, default_weight=1.0,
+                 lease_seconds=60, poll_interval=1.0, kind='merge'):
+        self.store = store
+        self.run_fn = run_fn
+        self.workers = workers
+        self.owner_weights = owner_weights or {}
+        self.default_weight = default_weight
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.kind = kind
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._threads or self.workers <= 0:
+                return
+            self.store.register_worker(self.worker_id, socket.gethostname(), self.workers, kind=self.kind)
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f"{self.kind}-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            threading.Thread(target=self._registration_loop, name=f"{self.kind}-registration", daemon=True).start()
+        print(f"{self.kind.capitalize()} worker {self.worker_id} started with {self.workers} slots")
+
+    def submit(self, spec, owner, priority=DEFAULT_PRIORITY, cost=1.0,
+               idempotency_key=None, fingerprint=None, idempotency_window=0):
+        """Queue a job and return ``(job, created)``; see ``JobStore.enqueue``."""
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority '{priority}'. Must be one of: {', '.join(PRIORITY_CLASSES)}")
+
+        kind = self.kind
+        job, created = self.store.enqueue(
+            kind, spec, owner, priority, PRIORITY_CLASSES[priority], cost,
+            weight=self.owner_weights.get(owner, self.default_weight),
+            idempotency_key=idempotency_key, fingerprint=fingerprint,
+            idempotency_window=idempotency_window
+        )
+        if created:
+            print(f"Queued {kind} job {job['id']} for owner {owner} ({priority}, cost {job['cost']:.1f})")
+            self._wakeup.set()
+        else:
+            print(f"Duplicate submission for idempotency key {idempotency_key}, reusing job {job['id']}")
+        return job, created
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job has finished (on any worker) and return it."""
+        deadline = time.time() + timeout if timeout else None
+        while True:
+            job = self.store.get(job_id)
+            if job is None or job['status'] in ('completed', 'failed'):
+                return job
+            if deadline and time.time() >= deadline:
+                return job
+            time.sleep(self.poll_interval / 2)
+
+    def queue_position(self, job):
+        return self.store.queue_position(job)
+
+    def estimated_wait(self, job):
+        """Seconds until ``job`` should start, from the estimated cost of the work ahead of it."""
+        if job['status'] != 'queued':
+            return 0.0
+        slots = max(self.store.active_slots(max_age=self.lease_seconds, kind=job['kind']), 1)
+        return self.store.backlog(job) / slots
+
+    def status(self, job_id):
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        return {
+            'jobId': job['id'],
+            'kind': job['kind'],
+            'jobStatus': job['status'],
+            'priority': job['priority'],
+            'owner': job['owner'],
+            'queuePosition': self.queue_position(job),
+            'queueLength': self.store.queue_length(kind=job['kind']),
+            'estimatedSeconds': round(job['cost'], 2),
+            'estimatedWaitSeconds': round(self.estimated_wait(job), 2),
+            'attempts': job['attempts'],
+            'worker': job['leaseOwner'],
+            'submittedAt': job['submittedAt'],
+            'startedAt': job['startedAt'],
+            'finishedAt': job['finishedAt'],
+            'result': job['result'],
+        }
+
+    def _registration_loop(self):
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            try:
+                self.store.register_worker(self.worker_id, socket.gethostname(), self.workers, kind=self.kind)
+            except Exception as e:
+                print(f"Error refreshing {self.kind} worker registration: {str(e)}")
+
+    def _heartbeat_loop(self, job_id, stop):
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                if not self.store.heartbeat(job_id, self.worker_id, self.lease_seconds):
+                    print(f"WARNING: lost lease on job {job_id}")
+                    return
+            except Exception as e:
+                print(f"Error sending heartbeat for job {job_id}: {str(e)}")
+
+    def _worker_loop(self):
+        while True:
+            try:
+                job = self.store.claim(self.worker_id, self.lease_seconds, kinds=(self.kind,))
+            except Exception as e:
+                print(f"Error claiming {self.kind} job: {str(e)}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            self._run(job)
+
+    def _run(self, job):
+        print(f"Starting {job['kind']} job {job['id']} (attempt {job['attempts']}, waited {job['startedAt'] - job['submittedAt']:.1f}s)")
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat_loop, args=(job['id'], stop_heartbeat), daemon=True)
+        heartbeat.start()
+        try:
+            payload, status_code = self.run_fn(job['spec'])
+        except Exception as e:
+            traceback.print_exc()
+            payload, status_code = {'error': str(e), 'status': False}, 500
+        finally:
+            stop_heartbeat.set()
+
+        if self.store.complete(job['id'], self.worker_id, payload, status_code):
+            print(f"{job['kind'].capitalize()} job {job['id']} finished with status {status_code} in {time.time() - job['startedAt']:.1f}s")
+        else:
+            print(f"WARNING: result of job {job['id']} discarded, lease was taken over by another worker")
+
+
+def parse_owner_weights(value):
+    """Parse ``owner=weight`` pairs from a comma-separated string.
+
+    Raises ValueError for a weight that is not a positive number, since a
+    zero or negative weight would give its owner unbounded priority.
+    """
+    weights = {}
+    for pair in (value or '').split(','):
+        if '=' not in pair:
+            continue
+        owner, weight = pair.split('=', 1)
+        try:
+            parsed = float(weight)
+        except ValueError:
+            parsed = None
+        if parsed is None or not math.isfinite(parsed) or parsed <= 0:
+            raise ValueError(f"Invalid render weight for {owner.strip()}: {weight.strip()!r} (must be a positive number)")
+        weights[owner.strip()] = parsed
+    return weights
@@ -0,0 +1,86 @@
+"""
+Render worker entry point.
+
+Runs merges claimed from the shared job queue in a pool of worker processes,
+separate from the HTTP API. Start the API with RENDER_MODE=queue so it only
+enqueues jobs and serves their status, then size the two tiers independently:
+
+    gunicorn -k gthread -w 4 --threads 8 -b 0.0.0.0:5000 app:app
+    python render_worker.py --processes 2 --slots 1
+
+Both tiers must point JOB_DB_PATH at the same database.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+
+def run_worker_process(slots):
+    # Importing app must not start its own inline render threads
+    os.environ['RENDER_MODE'] = 'worker'
+    import app
+    from render_scheduler import RenderScheduler
+
+    scheduler = RenderScheduler(
+        app.job_store,
+        app.merge_clips,
+        workers=slots,
+        owner_weights=app.RENDER_OWNER_WEIGHTS,
+        lease_seconds=app.JOB_LEASE_SECONDS
+    )
+    scheduler.start()
+    # Whisper transcriptions of caption-less videos and source prefetches share the job queue
+    app.transcribe_scheduler.start()
+    app.prefetch_scheduler.start()
+    while True:
+        time.sleep(3600)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run ClipSmart render workers")
+    parser.add_argument('--processes', type=int, default=int(os.getenv('RENDER_PROCESSES', 1)),
+                        help="Number of worker processes (default: RENDER_PROCESSES or 1)")
+    parser.add_argument('--slots', type=int, default=int(os.getenv('RENDER_WORKERS', 1)),
+                        help="Concurrent merges per process (default: RENDER_WORKERS or 1)")
+    args = parser.parse_args()
+
+    processes = {}
+    stopping = False
+
+    def spawn(index):
+        process = multiprocessing.Process(target=run_worker_process, args=(args.slots,), name=f"render-{index}")
+        process.start()
+        processes[index] = process
+        print(f"Started render process {index} (pid {process.pid}) with {args.slots} slots")
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        print("Stopping render workers...")
+        for process in processes.values():
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for index in range(args.processes):
+        spawn(index)
+
+    # Restart crashed processes; their in-flight jobs are re-leased once the lease expires
+    while not stopping:
+        time.sleep(5)
+        for index, process in list(processes.items()):
+            if not process.is_alive() and not stopping:
+                print(f"Render process {index} exited with code {process.exitcode}, restarting")
+                spawn(index)
+
+    for process in processes.values():
+        process.join(timeout=30)
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
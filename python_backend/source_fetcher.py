@@ -0,0 +1,373 @@
+import json
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: downloads are only deduplicated within a process
+    fcntl = None
+
+from deadline import Deadline, DeadlineExceeded
+
+
+class SourceDeferred(Exception):
+    """Raised when a background fetch gave way to render jobs for longer than it may wait."""
+
+
+class _Flight:
+    __slots__ = ('done', 'error', 'provider', 'waiters', 'background')
+
+    def __init__(self, background):
+        self.done = threading.Event()
+        self.error = None
+        self.provider = None
+        self.waiters = 0
+        self.background = background
+
+
+class SourceFetcher:
+    """Download source videos into ``directory`` once, however many callers ask for them.
+
+    A caller asking for a video that is already being fetched in this
+    process waits for that download instead of starting another; across
+    processes an advisory file lock does the same where ``fcntl`` is
+    available. Downloads go to a temporary ``.part`` name and are moved into
+    place when complete, so readers never see a partial file.
+
+    Callers reading a cached video hold ``use()`` for as long as they need
+    it; ``remove()`` and ``evict()`` leave such videos, and videos being
+    fetched, alone. When ``max_age`` or ``max_bytes`` is set, every
+    completed download evicts videos unused for ``max_age`` seconds, then
+    the least recently used ones until the cache fits in ``max_bytes``.
+
+    Background fetches (prefetches) give way to renders: before they start
+    they wait while ``busy()`` returns true, for at most ``max_defer``
+    seconds, unless a foreground caller is waiting for the same video.
+    """
+
+    def __init__(self, router, directory, validate=None, ffprobe_path='ffprobe', busy=None,
+                 max_defer=600, poll_interval=2.0, lock_dir=None, max_age=None, max_bytes=None, partial_grace=60):
+        self.router = router
+        self.directory = directory
+        self.lock_dir = lock_dir or directory
+        self.validate = validate
+        self.ffprobe_path = ffprobe_path
+        self.busy = busy
+        self.max_defer = max_defer
+        self.poll_interval = poll_interval
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.partial_grace = partial_grace  # A .part file written to this recently is still in progress
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._users = {}
+
+    def path(self, video_id):
+        return os.path.join(self.directory, f"{video_id}.mp4")
+
+    def partial_path(self, video_id):
+        """Temporary name for a download in progress, unique to this process and thread."""
+        return os.path.join(self.directory, f"{video_id}.{os.getpid()}-{threading.get_ident()}.mp4.part")
+
+    def index_path(self, video_id):
+        return os.path.join(self.directory, f"{video_id}.index.json")
+
+    def cached(self, video_id):
+        path = self.path(video_id)
+        return os.path.exists(path) and os.path.getsize(path) > 0
+
+    def in_flight(self):
+        with self._lock:
+            return sorted(self._flights)
+
+    def fetch(self, video_id, background=False, height=None, deadline=None):
+        """Make sure the video is in the cache; returns ``(path, provider)``.
+
+        ``height`` is the output height the source is downloaded for; a
+        cached or in-flight copy is used whatever height it was fetched for.
+        ``provider`` is None when the file was already cached or was
+        downloaded by another caller. ``deadline`` bounds the wait for
+        another caller's download as well as this one's.
+        """
+        deadline = deadline or Deadline(None)
+        path = self.path(video_id)
+        with self._lock:
+            if self.cached(video_id):
+                return path, None
+            flight = self._flights.get(video_id)
+            owner = flight is None
+            if owner:
+                flight = self._flights[video_id] = _Flight(background)
+            elif not background:
+                flight.waiters += 1
+
+        if not owner:
+            print(f"Waiting for download of {video_id} already in flight")
+            if not flight.done.wait(deadline.timeout()):
+                deadline.check()
+            if flight.error is not None:
+                raise flight.error
+            return path, None
+
+        try:
+            if background:
+                self._defer(video_id, flight)
+            with self._file_lock(video_id, deadline):
+                if self.cached(video_id):
+                    return path, None
+                tmp_path = self.partial_path(video_id)
+                flight.provider = self.router.download(video_id, tmp_path, validate=self.validate, height=height, deadline=deadline)
+                os.replace(tmp_path, path)
+            self._evict_over_limits()
+            return path, flight.provider
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(video_id, None)
+            flight.done.set()
+
+    def store(self, video_id, tmp_path):
+        """Move a complete download made elsewhere (e.g. a proxied stream) into the cache.
+
+        The file is validated first and dropped if it is unusable or the
+        video was cached meanwhile. Returns True if it was stored.
+        """
+        try:
+            if self.validate is not None:
+                self.validate(tmp_path, deadline=Deadline(None))
+            with self._file_lock(video_id, Deadline(None)):
+                stored = not self.cached(video_id)
+                if stored:
+                    os.replace(tmp_path, self.path(video_id))
+            if stored:
+                self._evict_over_limits()
+                return True
+        except Exception as e:
+            print(f"Not caching {video_id}: {str(e)}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+    @contextmanager
+    def use(self, video_id):
+        """Keep ``video_id`` from being removed until the block exits, in this and other processes.
+
+        The video need not be cached yet, so callers can take it before fetching.
+        """
+        with self._lock:
+            self._users[video_id] = self._users.get(video_id, 0) + 1
+        handle = None
+        try:
+            if fcntl is not None:
+                handle = open(self._use_lock_path(video_id), 'a')
+                fcntl.flock(handle, fcntl.LOCK_SH)
+            self._touch(video_id)
+            yield self.path(video_id)
+        finally:
+            if handle is not None:
+                handle.close()
+            with self._lock:
+                self._users[video_id] -= 1
+                if not self._users[video_id]:
+                    del self._users[video_id]
+
+    def in_use(self, filename):
+        """Whether a file in ``directory`` belongs to a download in progress or a video in use."""
+        video_id = filename.split('.', 1)[0]
+        if filename.endswith('.part'):
+            try:
+                if time.time() - os.path.getmtime(os.path.join(self.directory, filename)) < self.partial_grace:
+                    return True
+            except OSError:
+                return False
+            return not self._lock_free(self._file_lock_path(video_id))
+        with self._lock:
+            if video_id in self._flights or self._users.get(video_id):
+                return True
+        return not self._lock_free(self._use_lock_path(video_id))
+
+    def remove(self, video_id):
+        """Delete a cached video and its index unless it is in use; returns True if the video was deleted."""
+        with self._lock:
+            if video_id in self._flights or self._users.get(video_id):
+                return False
+            handle = None
+            if fcntl is not None:
+                handle = open(self._use_lock_path(video_id), 'a')
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    handle.close()
+                    return False
+            try:
+                removed = False
+                for path in (self.path(video_id), self.index_path(video_id)):
+                    try:
+                        os.remove(path)
+                        removed = removed or path == self.path(video_id)
+                    except FileNotFoundError:
+                        pass
+                return removed
+            finally:
+                if handle is not None:
+                    handle.close()
+
+    def evict(self, max_age=None, max_bytes=None):
+        """Remove cached videos unused for ``max_age`` seconds, then the least recently used until the rest fit in ``max_bytes``.
+
+        Videos being fetched or in use are kept. Returns the IDs removed.
+        """
+        now = time.time()
+        entries = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.mp4'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, filename))
+            except OSError:
+                continue
+            entries.append((max(stat.st_atime, stat.st_mtime), stat.st_size, filename[:-len('.mp4')]))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = []
+        for used, size, video_id in entries:
+            expired = max_age is not None and now - used >= max_age
+            if not expired and (max_bytes is None or total <= max_bytes):
+                continue
+            if self.remove(video_id):
+                removed.append(video_id)
+                total -= size
+        return removed
+
+    def _evict_over_limits(self):
+        if self.max_age is None and self.max_bytes is None:
+            return
+        try:
+            removed = self.evict(self.max_age, self.max_bytes)
+        except OSError as e:
+            print(f"[WARNING] Source cache eviction failed: {str(e)}")
+            return
+        if removed:
+            print(f"[INFO] Evicted {len(removed)} cached source videos: {', '.join(removed)}")
+
+    def _touch(self, video_id):
+        # The access time orders eviction; the modification time is left alone, as indexes are keyed on it
+        try:
+            stat = os.stat(self.path(video_id))
+            os.utime(self.path(video_id), (time.time(), stat.st_mtime))
+        except OSError:
+            pass
+
+    def _use_lock_path(self, video_id):
+        return os.path.join(self.lock_dir, f"source_{video_id}.use.lock")
+
+    def _file_lock_path(self, video_id):
+        return os.path.join(self.lock_dir, f"source_{video_id}.lock")
+
+    @staticmethod
+    def _lock_free(path):
+        if fcntl is None or not os.path.exists(path):
+            return True
+        with open(path, 'a') as handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            fcntl.flock(handle, fcntl.LOCK_UN)
+        return True
+
+    def _defer(self, video_id, flight):
+        if self.busy is None:
+            return
+        deadline = time.time() + self.max_defer
+        logged = False
+        while flight.waiters == 0 and self.busy():
+            if time.time() >= deadline:
+                raise SourceDeferred(f"Prefetch of {video_id} deferred to render jobs for {self.max_defer}s")
+            if not logged:
+                print(f"Deferring prefetch of {video_id} while render jobs are active")
+                logged = True
+            time.sleep(self.poll_interval)
+
+    def _file_lock(self, video_id, deadline):
+        return _FileLock(self._file_lock_path(video_id), deadline)
+
+    def index(self, video_id, rebuild=False):
+        """Probe a cached video's duration, resolution and keyframe times, stored next to it.
+
+        The index is rebuilt when the video file changed since it was made.
+        """
+        path = self.path(video_id)
+        stat = os.stat(path)
+        index_path = self.index_path(video_id)
+        if not rebuild:
+            try:
+                with open(index_path, 'r') as f:
+                    index = json.load(f)
+                if index.get('size') == stat.st_size and index.get('mtime') == stat.st_mtime:
+                    return index
+            except (OSError, ValueError):
+                pass
+
+        probe = subprocess.run(
+            [self.ffprobe_path, '-v', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'stream=width,height,codec_name:format=duration', '-of', 'json', path],
+            capture_output=True, text=True, timeout=30
+        )
+        info = json.loads(probe.stdout or '{}')
+        stream = (info.get('streams') or [{}])[0]
+        keyframes = subprocess.run(
+            [self.ffprobe_path, '-v', 'error', '-select_streams', 'v:0', '-skip_frame', 'nokey',
+             '-show_entries', 'frame=pts_time', '-of', 'csv=p=0', path],
+            capture_output=True, text=True, timeout=120
+        )
+        index = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'duration': float(info.get('format', {}).get('duration') or 0) or None,
+            'width': stream.get('width'),
+            'height': stream.get('height'),
+            'videoCodec': stream.get('codec_name'),
+            'keyframes': [round(float(line), 3) for line in keyframes.stdout.split() if line.strip() not in ('', 'N/A')],
+        }
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path)
+        return index
+
+
+class _FileLock:
+    def __init__(self, path, deadline, poll_interval=0.5):
+        self.path = path
+        self.deadline = deadline
+        self.poll_interval = poll_interval
+        self.file = None
+
+    def __enter__(self):
+        if fcntl is None:
+            return self
+        self.file = open(self.path, 'a')
+        while True:
+            try:
+                fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return self
+            except BlockingIOError:
+                pass
+            try:
+                time.sleep(self.deadline.timeout(self.poll_interval))
+            except DeadlineExceeded:
+                self.file.close()
+                self.file = None
+                raise
+
+    def __exit__(self, *exc):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+        return False
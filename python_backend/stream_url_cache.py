@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stream_urls (
+    video_id TEXT NOT NULL,
+    format TEXT NOT NULL,
+    url TEXT NOT NULL,
+    quality_label TEXT,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (video_id, format)
+);
+CREATE INDEX IF NOT EXISTS stream_urls_expiry ON stream_urls (expires_at);
+"""
+
+
+def url_expiry(url):
+    """The ``expire`` timestamp signed into a googlevideo URL, or None if it has none."""
+    try:
+        return float(parse_qs(urlsplit(url).query)['expire'][0])
+    except (KeyError, IndexError, ValueError):
+        return None
+
+
+class StreamUrlCache:
+    """Resolved stream URLs keyed by video ID and format, kept until shortly before they expire.
+
+    Signed googlevideo URLs stay valid until their ``expire`` parameter
+    (usually about six hours), so a resolved URL can be reused by retries,
+    prefetches and repeat downloads instead of paying for another metadata
+    call. Entries are dropped ``margin`` seconds before that, leaving time to
+    finish a download started just before. URLs without an ``expire``
+    parameter are kept for ``default_ttl`` seconds.
+
+    Like the transcript cache this is an in-process LRU in front of a SQLite
+    file, so every worker on the host shares resolutions.
+    """
+
+    def __init__(self, db_path, memory_size=1024, margin=600, default_ttl=1800):
+        self.db_path = db_path
+        self.memory_size = memory_size
+        self.margin = margin
+        self.default_ttl = default_ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def get(self, video_id, fmt):
+        """Return ``(url, quality_label)`` for a resolution that is still fresh, or None."""
+        key = (video_id, fmt)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[2] > now:
+                    self._memory.move_to_end(key)
+                    return entry[0], entry[1]
+                del self._memory[key]
+
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT url, quality_label, expires_at FROM stream_urls "
+                    "WHERE video_id = ? AND format = ? AND expires_at > ?",
+                    (video_id, fmt, now)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading stream URL cache: {str(e)}")
+            return None
+        if row is None:
+            return None
+        self._remember(key, row)
+        return row[0], row[1]
+
+    def put(self, video_id, fmt, url, quality_label=None):
+        now = time.time()
+        expire = url_expiry(url)
+        expires_at = expire - self.margin if expire is not None else now + self.default_ttl
+        if expires_at <= now:
+            return
+        self._remember((video_id, fmt), (url, quality_label, expires_at))
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO stream_urls (video_id, format, url, quality_label, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (video_id, fmt, url, quality_label, expires_at)
+                )
+                conn.execute("DELETE FROM stream_urls WHERE expires_at < ?", (now,))
+        except sqlite3.Error as e:
+            print(f"Error writing stream URL cache: {str(e)}")
+
+    def invalidate(self, video_id):
+        """Forget every resolution of a video, e.g. after its URL was rejected."""
+        with self._lock:
+            for key in [key for key in self._memory if key[0] == video_id]:
+                del self._memory[key]
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM stream_urls WHERE video_id = ?", (video_id,))
+        except sqlite3.Error as e:
+            print(f"Error writing stream URL cache: {str(e)}")
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
@@ -0,0 +1,170 @@
+import time
+
+import pytest
+
+from download_providers import (
+    DownloadFailed, DownloadProvider, MIN_VIDEO_BYTES, ProviderRouter, ProviderUnavailable, RapidApiProvider,
+    VideoUnavailable, video_error_reason,
+)
+
+
+class FakeProvider(DownloadProvider):
+    def __init__(self, name, error=None):
+        self.name = name
+        self.error = error
+        self.calls = 0
+
+    def download(self, video_id, output_path, height=None, deadline=None):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        with open(output_path, 'wb') as f:
+            f.write(b'\0' * MIN_VIDEO_BYTES)
+
+
+@pytest.fixture
+def output(tmp_path):
+    return str(tmp_path / 'video.mp4')
+
+
+def states(router):
+    return {health['name']: health['state'] for health in router.snapshot()}
+
+
+def test_breaker_opens_after_consecutive_failures(output):
+    broken = FakeProvider('broken', RuntimeError('HTTP 500'))
+    router = ProviderRouter([broken], failure_threshold=2, reset_timeout=60)
+    with pytest.raises(DownloadFailed):
+        router.download('a', output)
+    assert states(router)['broken'] == 'closed'
+    with pytest.raises(DownloadFailed):
+        router.download('a', output)
+    assert states(router)['broken'] == 'open'
+    with pytest.raises(DownloadFailed, match='circuit open'):
+        router.download('a', output)
+    assert broken.calls == 2
+
+
+def test_half_open_trial_closes_or_reopens_the_breaker(output):
+    provider = FakeProvider('flaky', RuntimeError('HTTP 500'))
+    router = ProviderRouter([provider], failure_threshold=1, reset_timeout=0.05)
+    with pytest.raises(DownloadFailed):
+        router.download('a', output)
+    assert states(router)['flaky'] == 'open'
+    with pytest.raises(DownloadFailed, match='circuit open'):
+        router.download('a', output)
+
+    time.sleep(0.06)
+    assert states(router)['flaky'] == 'half-open'
+    # A failed trial re-opens the breaker for twice as long
+    with pytest.raises(DownloadFailed):
+        router.download('a', output)
+    assert states(router)['flaky'] == 'open'
+    assert router.snapshot()[0]['openForSeconds'] == pytest.approx(0.1, abs=0.05)
+
+    time.sleep(0.11)
+    provider.error = None
+    router.download('a', output)
+    assert states(router)['flaky'] == 'closed'
+
+
+def test_unavailable_video_is_not_held_against_the_provider(output):
+    provider = FakeProvider('ytdlp', VideoUnavailable('a', 'private'))
+    backup = FakeProvider('backup')
+    router = ProviderRouter([provider, backup], failure_threshold=1)
+    for _ in range(3):
+        with pytest.raises(VideoUnavailable):
+            router.download('a', output)
+    assert states(router)['ytdlp'] == 'closed'
+    assert router.snapshot()[0]['failures'] == 0
+    assert backup.calls == 0
+
+
+def test_invalid_source_tries_the_next_provider_without_failing_it(output):
+    first, second = FakeProvider('first'), FakeProvider('second')
+    router = ProviderRouter([first, second], failure_threshold=1)
+    validated = []
+
+    def validate(path, deadline=None):
+        validated.append(path)
+        if len(validated) == 1:
+            raise ValueError('Invalid media file downloaded')
+
+    assert router.download('a', output, validate=validate) == 'second'
+    assert states(router) == {'first': 'closed', 'second': 'closed'}
+    assert all(health['failures'] == 0 for health in router.snapshot())
+
+
+def test_half_open_trial_is_released_by_a_video_error(output):
+    provider = FakeProvider('flaky', RuntimeError('HTTP 500'))
+    router = ProviderRouter([provider], failure_threshold=1, reset_timeout=0.05)
+    with pytest.raises(DownloadFailed):
+        router.download('a', output)
+    time.sleep(0.06)
+    provider.error = VideoUnavailable('a', 'removed')
+    with pytest.raises(VideoUnavailable):
+        router.download('a', output)
+    # The trial said nothing about the provider, so the next request may try again
+    assert states(router)['flaky'] == 'half-open'
+
+
+@pytest.mark.parametrize('message, reason', [
+    ('ERROR: [youtube] abc: Private video. Sign in if you\'ve been granted access to this video', 'private'),
+    ('ERROR: [youtube] abc: Video unavailable. This video has been removed by the uploader', 'removed'),
+    ('ERROR: [youtube] abc: Sign in to confirm your age. This video may be inappropriate', 'age-restricted'),
+    ("ERROR: [youtube] abc: Sign in to confirm you're not a bot", None),
+    ('ERROR: unable to download video data: HTTP Error 403: Forbidden', None),
+])
+def test_video_error_reason(message, reason):
+    assert video_error_reason(message) == reason
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+def progressive(height, itag):
+    return {'url': f'https://rr1---sn-x.googlevideo.com/{itag}', 'height': height, 'qualityLabel': f'{height}p',
+            'mimeType': 'video/mp4; codecs="avc1.42001E, mp4a.40.2"'}
+
+
+def adaptive(height, itag):
+    return {'url': f'https://rr1---sn-x.googlevideo.com/{itag}', 'height': height, 'qualityLabel': f'{height}p',
+            'mimeType': 'video/mp4; codecs="avc1.640028"'}
+
+
+def stub_metadata(monkeypatch, formats, adaptive_formats):
+    monkeypatch.setattr(
+        'download_providers.requests.get',
+        lambda *args, **kwargs: FakeResponse({'formats': formats, 'adaptiveFormats': adaptive_formats})
+    )
+
+
+def test_rapidapi_declines_without_a_tall_enough_progressive_stream(monkeypatch):
+    stub_metadata(monkeypatch, [progressive(360, 18)], [adaptive(1080, 137), adaptive(720, 136)])
+    with pytest.raises(ProviderUnavailable):
+        RapidApiProvider('key').resolve('a', height=720)
+    url, cached = RapidApiProvider('key').resolve('a', height=360)
+    assert url.endswith('/18') and not cached
+
+
+def test_rapidapi_uses_the_tallest_stream_of_a_short_source(monkeypatch):
+    stub_metadata(monkeypatch, [progressive(360, 18), progressive(480, 59)], [adaptive(480, 135)])
+    url, _ = RapidApiProvider('key').resolve('a', height=720)
+    assert url.endswith('/59')
+
+
+def test_declining_provider_is_skipped_without_failing(output):
+    declining = FakeProvider('rapidapi', ProviderUnavailable('No progressive stream of at least 720p'))
+    backup = FakeProvider('ytdlp')
+    router = ProviderRouter([declining, backup], failure_threshold=1)
+    assert router.download('a', output) == 'ytdlp'
+    assert states(router) == {'rapidapi': 'closed', 'ytdlp': 'closed'}
+    assert router.snapshot()[-1]['failures'] == 0
@@ -0,0 +1,35 @@
+import time
+
+import pytest
+
+from deadline import Deadline, DeadlineExceeded
+from download_scheduler import DownloadScheduler, TokenBucket
+
+
+def test_slot_wait_stops_at_the_deadline():
+    scheduler = DownloadScheduler(max_connections=1, max_per_host=None)
+    with scheduler.transfer('https://a.example.com/video'):
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            with scheduler.transfer('https://b.example.com/video', Deadline(0.1)):
+                pass
+        assert time.monotonic() - started < 1
+        assert scheduler.snapshot()['waiting'] == {'interactive': 0, 'background': 0}
+
+
+def test_bandwidth_wait_stops_at_the_deadline():
+    bucket = TokenBucket(rate=1000)
+    bucket.consume(1000)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        # Would take 10 s at 1000 bytes per second
+        bucket.consume(10000, deadline=Deadline(0.1))
+    assert time.monotonic() - started < 1
+    assert bucket._interactive_waiting == 0
+
+
+def test_transfer_passes_its_deadline_to_the_bandwidth_cap():
+    scheduler = DownloadScheduler(bandwidth=1000)
+    with pytest.raises(DeadlineExceeded):
+        with scheduler.transfer('https://a.example.com/video', Deadline(0.1)) as transfer:
+            transfer.consume(20000)
@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+from job_store import JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / 'jobs.sqlite3'))
+
+
+def enqueue(store, key, kind='merge', window=600):
+    return store.enqueue(kind, {'key': key}, 'owner', 'final', 1, 1.0,
+                         idempotency_key=key, fingerprint=key, idempotency_window=window)
+
+
+def test_key_is_kept_while_the_job_is_unfinished(store):
+    job, _ = enqueue(store, 'slow', window=0)
+    time.sleep(0.01)
+    again, created = enqueue(store, 'slow', window=0)
+    assert not created and again['id'] == job['id']
+
+    store.claim('worker', 60)
+    time.sleep(0.01)
+    again, created = enqueue(store, 'slow', window=0)
+    assert not created and again['id'] == job['id']
+
+
+def test_window_counts_from_completion(store):
+    job, _ = enqueue(store, 'done', window=0.2)
+    store.claim('worker', 60)
+    store.complete(job['id'], 'worker', {'status': True}, 200)
+
+    again, created = enqueue(store, 'done', window=0.2)
+    assert not created and again['id'] == job['id']
+    time.sleep(0.3)
+    again, created = enqueue(store, 'done', window=0.2)
+    assert created and again['id'] != job['id']
+
+
+def test_short_windows_do_not_purge_longer_ones(store):
+    long_job, _ = enqueue(store, 'transcribe', kind='transcribe', window=3600)
+    store.claim('worker', 60, kinds=['transcribe'])
+    store.complete(long_job['id'], 'worker', {'status': True}, 200)
+
+    enqueue(store, 'prefetch', kind='prefetch', window=0)
+    time.sleep(0.01)
+    enqueue(store, 'other', kind='prefetch', window=0)
+
+    again, created = enqueue(store, 'transcribe', kind='transcribe', window=3600)
+    assert not created and again['id'] == long_job['id']
+
+
+def test_failed_job_is_retried(store):
+    job, _ = enqueue(store, 'failed')
+    store.claim('worker', 60)
+    store.complete(job['id'], 'worker', {'status': False}, 500)
+    again, created = enqueue(store, 'failed')
+    assert created and again['id'] != job['id']
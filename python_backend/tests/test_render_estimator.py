@@ -0,0 +1,20 @@
+from render_estimator import RenderEstimator
+
+
+def download_timings(seconds):
+    return {'downloads': [{'seconds': seconds}]}
+
+
+def test_processes_share_the_stats_file(tmp_path):
+    path = str(tmp_path / 'render_stats.json')
+    first = RenderEstimator(path)
+    second = RenderEstimator(path)
+
+    first.record(download_timings(100))
+    clips = [{'videoId': 'a', 'startTime': 0, 'endTime': 10}]
+    assert second.estimate(clips)['stages']['download'] == 100
+
+    # Each writer folds its sample into the other's instead of overwriting it
+    second.record(download_timings(100))
+    first.record(download_timings(100))
+    assert RenderEstimator(path).estimate(clips)['basedOnSamples'] == 3
@@ -0,0 +1,14 @@
+import pytest
+
+from render_scheduler import parse_owner_weights
+
+
+def test_parse_owner_weights():
+    assert parse_owner_weights('alice=2, bob=0.5,') == {'alice': 2.0, 'bob': 0.5}
+    assert parse_owner_weights('') == {}
+
+
+@pytest.mark.parametrize('value', ['alice=0', 'alice=-1', 'alice=heavy', 'alice=inf', 'alice=nan'])
+def test_parse_owner_weights_rejects_non_positive(value):
+    with pytest.raises(ValueError, match='alice'):
+        parse_owner_weights(value)
@@ -0,0 +1,94 @@
+import os
+import time
+
+import pytest
+
+from source_fetcher import SourceFetcher
+
+
+class FakeRouter:
+    def __init__(self):
+        self.paths = []
+
+    def download(self, video_id, output_path, validate=None, height=None, deadline=None):
+        self.paths.append(output_path)
+        with open(output_path, 'wb') as f:
+            f.write(b'\0' * 2048)
+        return 'fake'
+
+
+@pytest.fixture
+def fetcher(tmp_path):
+    directory = tmp_path / 'Download'
+    directory.mkdir()
+    return SourceFetcher(FakeRouter(), str(directory), lock_dir=str(tmp_path))
+
+
+def cache(fetcher, video_id, size=2048, age=0):
+    path = fetcher.path(video_id)
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+    used = time.time() - age
+    os.utime(path, (used, used))
+    return path
+
+
+def test_downloads_to_a_part_file(fetcher):
+    path, provider = fetcher.fetch('abc')
+    assert provider == 'fake'
+    assert fetcher.router.paths[0].endswith('.mp4.part')
+    assert os.listdir(fetcher.directory) == ['abc.mp4']
+    assert path == fetcher.path('abc')
+
+
+def test_remove_skips_videos_in_use(fetcher):
+    cache(fetcher, 'abc')
+    with fetcher.use('abc'):
+        assert fetcher.in_use('abc.mp4')
+        assert not fetcher.remove('abc')
+        assert fetcher.evict(max_age=0) == []
+    assert not fetcher.in_use('abc.mp4')
+    assert fetcher.remove('abc')
+    assert not fetcher.cached('abc')
+
+
+def test_remove_takes_the_index_along(fetcher):
+    cache(fetcher, 'abc')
+    open(fetcher.index_path('abc'), 'w').close()
+    assert fetcher.remove('abc')
+    assert os.listdir(fetcher.directory) == []
+
+
+def test_recent_part_files_are_in_use(fetcher):
+    part = fetcher.partial_path('abc')
+    open(part, 'w').close()
+    name = os.path.basename(part)
+    assert fetcher.in_use(name)
+    os.utime(part, (time.time() - 120, time.time() - 120))
+    assert not fetcher.in_use(name)
+
+
+def test_evict_by_age(fetcher):
+    cache(fetcher, 'old', age=7200)
+    cache(fetcher, 'new', age=60)
+    assert fetcher.evict(max_age=3600) == ['old']
+    assert fetcher.cached('new')
+
+
+def test_evict_least_recently_used_over_size(fetcher):
+    cache(fetcher, 'a', age=300)
+    cache(fetcher, 'b', age=200)
+    cache(fetcher, 'c', age=100)
+    with fetcher.use('a'):
+        # Taking a video counts as using it, so b is now the least recently used
+        pass
+    assert fetcher.evict(max_bytes=4096) == ['b']
+    assert fetcher.cached('a') and fetcher.cached('c')
+
+
+def test_completed_downloads_evict_over_limits(fetcher):
+    fetcher.max_bytes = 4096
+    cache(fetcher, 'a', age=300)
+    cache(fetcher, 'b', age=200)
+    fetcher.fetch('c')
+    assert sorted(os.listdir(fetcher.directory)) == ['b.mp4', 'c.mp4']
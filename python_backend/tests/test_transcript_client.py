@@ -0,0 +1,19 @@
+from types import SimpleNamespace
+
+from transcript_client import TranscriptClient
+
+
+def endpoint(**config):
+    return SimpleNamespace(name='proxy', proxy_config=SimpleNamespace(**config))
+
+
+def test_keep_alive_for_plain_proxies():
+    client = TranscriptClient(proxy_pool=None)
+    assert client._keeps_alive(endpoint())
+    assert client._keeps_alive(endpoint(prevent_keeping_connections_alive=True, retries_when_blocked=0))
+    assert not TranscriptClient(proxy_pool=None, keep_alive=False)._keeps_alive(endpoint())
+
+
+def test_rotating_proxy_with_retries_closes_connections():
+    client = TranscriptClient(proxy_pool=None)
+    assert not client._keeps_alive(endpoint(prevent_keeping_connections_alive=True, retries_when_blocked=10))
@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+from video_metadata import BATCH_SIZE, LocalVideoApi, VideoMetadataService, parse_duration
+
+
+def item(duration='PT10M', privacy='public', upload='processed', live='none'):
+    return {
+        'snippet': {'title': 'A video', 'liveBroadcastContent': live},
+        'contentDetails': {'duration': duration, 'definition': 'hd'},
+        'status': {'privacyStatus': privacy, 'uploadStatus': upload},
+    }
+
+
+@pytest.fixture
+def service(tmp_path):
+    def make(items=None, authoritative=False, **kwargs):
+        api = LocalVideoApi(items, index_dir=str(tmp_path), authoritative=authoritative)
+        return VideoMetadataService(api, str(tmp_path / 'metadata.sqlite3'), **kwargs)
+    return make
+
+
+@pytest.mark.parametrize('value, seconds', [
+    ('PT10M', 600), ('PT1H2M3S', 3723), ('P1DT1S', 86401), ('PT0S', 0), ('P0D', 0), ('PT1.5S', 1.5),
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == seconds
+
+
+def test_parse_duration_rejects_garbage():
+    assert parse_duration('ten minutes') is None
+    assert parse_duration(None) is None
+
+
+def test_lookup_batches_at_most_fifty_ids(service):
+    ids = [f"vid{n}" for n in range(120)]
+    metadata = service({video_id: item() for video_id in ids})
+    result = metadata.lookup(ids)
+    assert metadata.api.calls == 3
+    assert all(result[video_id]['durationSeconds'] == 600 for video_id in ids)
+
+
+def test_lookup_is_cached_in_memory_and_on_disk(service):
+    first = service({'a': item()})
+    first.lookup(['a'])
+    first.lookup(['a'])
+    assert first.api.calls == 1
+
+    # A second process sharing the database does not call the API either
+    second = service({})
+    assert second.lookup(['a'])['a']['durationSeconds'] == 600
+    assert second.api.calls == 0
+
+
+def test_unavailable_videos(service):
+    metadata = service({
+        'private': item(privacy='private'),
+        'processing': item(upload='uploaded'),
+        'live': item(duration='P0D', live='live'),
+    }, authoritative=True)
+    result = metadata.lookup(['private', 'processing', 'live', 'gone'])
+    assert result['private']['reason'] == 'private'
+    assert result['processing']['reason'] == 'still processing'
+    assert result['live']['reason'] == 'live broadcast'
+    assert not result['gone']['available']
+
+
+def test_missing_video_is_unknown_to_the_stand_in(service):
+    assert service({}).lookup(['unknown']) == {'unknown': None}
+
+
+def test_unavailable_videos_expire_sooner(service):
+    metadata = service({'private': item(privacy='private')}, negative_ttl=0)
+    metadata.lookup(['private'])
+    metadata.lookup(['private'])
+    assert metadata.api.calls == 2
+
+
+def test_stand_in_reads_source_index(service, tmp_path):
+    (tmp_path / 'cached.index.json').write_text(json.dumps({'duration': 95.4, 'height': 1080}))
+    result = service().lookup(['cached'])['cached']
+    assert result['durationSeconds'] == 95
+    assert result['definition'] == 'hd'
+
+
+def test_stand_in_loads_fixture_file(tmp_path):
+    path = tmp_path / 'fixtures.json'
+    path.write_text(json.dumps({'a': item('PT30S')}))
+    api = LocalVideoApi(str(path))
+    assert api.list(['a'])[0]['contentDetails']['duration'] == 'PT30S'
+    with pytest.raises(ValueError):
+        api.list([str(n) for n in range(BATCH_SIZE + 1)])
+
+
+def test_clip_errors(service):
+    metadata = service({'a': item('PT1M'), 'private': item(privacy='private')})
+    clips = [
+        {'videoId': 'a', 'startTime': 10, 'endTime': 60.5},
+        {'videoId': 'a', 'startTime': 30, 'endTime': 90},
+        {'videoId': 'a', 'startTime': 61, 'endTime': 70},
+        {'videoId': 'private', 'startTime': 0, 'endTime': 5},
+        {'videoId': 'unknown', 'startTime': 0, 'endTime': 5000},
+    ]
+    errors = metadata.clip_errors(clips)
+    assert len(errors) == 3
+    assert errors[0].startswith('Clip 2: ends at 90s')
+    assert errors[1].startswith('Clip 3: starts at 61s')
+    assert errors[2] == 'Clip 4: video private is unavailable (private)'
@@ -0,0 +1,79 @@
+import math
+import shutil
+import struct
+import wave
+
+import pytest
+
+from whisper_transcriber import (
+    BYTES_PER_SECOND, SAMPLE_RATE, StubWhisperBackend, WhisperTranscriber, merge_segments, plan_cuts,
+)
+
+
+def tone(seconds, amplitude=8000):
+    frames = int(seconds * SAMPLE_RATE)
+    return b''.join(struct.pack('<h', int(amplitude * math.sin(2 * math.pi * 440 * n / SAMPLE_RATE)))
+                    for n in range(frames))
+
+
+def silence(seconds):
+    return b'\x00\x00' * int(seconds * SAMPLE_RATE)
+
+
+class PcmTranscriber(WhisperTranscriber):
+    """Transcriber fed with ready-made PCM chunks, so chunk handling runs without ffmpeg."""
+
+    def __init__(self, chunks, **kwargs):
+        super().__init__(backend=StubWhisperBackend(), **kwargs)
+        self.chunks = chunks
+
+    def detect_silences(self, path):
+        return []
+
+    def iter_chunks(self, path, cuts):
+        offset = 0.0
+        for pcm in self.chunks:
+            yield offset, pcm
+            offset += len(pcm) / BYTES_PER_SECOND
+
+
+def test_plan_cuts_prefers_silences_near_the_target_length():
+    silences = [(50, 51), (118, 119), (200, 201), (250, 251)]
+    assert plan_cuts(silences, chunk_seconds=120, min_chunk_seconds=30, max_chunk_seconds=300) == [118.5, 250.5]
+
+
+def test_plan_cuts_forces_a_cut_without_silence():
+    assert plan_cuts([(700, 701)], chunk_seconds=120, min_chunk_seconds=30, max_chunk_seconds=300) == [300, 600, 700.5]
+
+
+def test_merge_segments_numbers_and_skips_empty_text():
+    merged = merge_segments([[(0, 5, ' hello ')], [(5, 4, 'x'), (6, 7, '  ')]])
+    assert [segment['id'] for segment in merged] == [1, 2]
+    assert merged[0]['text'] == 'hello'
+    assert merged[1]['duration'] == 0
+
+
+def test_stub_chunks_are_shifted_by_their_offset_and_merged_in_order():
+    transcriber = PcmTranscriber([silence(25), silence(15), silence(12)], concurrency=2)
+    segments = transcriber.transcribe_file('unused')
+    assert [(segment['startTime'], segment['endTime']) for segment in segments] == [
+        (0, 10), (10, 20), (20, 25), (25, 35), (35, 40), (40, 50), (50, 52),
+    ]
+    assert all(segment['text'] == '[en speech]' for segment in segments)
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='ffmpeg is not installed')
+def test_transcribe_file_cuts_at_silences(tmp_path):
+    path = str(tmp_path / 'speech.wav')
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(tone(40) + silence(1) + tone(40) + silence(1) + tone(10))
+
+    transcriber = WhisperTranscriber(backend=StubWhisperBackend(), chunk_seconds=40, min_chunk_seconds=20,
+                                     max_chunk_seconds=60, concurrency=2)
+    segments = transcriber.transcribe_file(path)
+    starts = [segment['startTime'] for segment in segments]
+    assert 40.5 in starts and 81.5 in starts
+    assert segments[-1]['endTime'] == pytest.approx(92, abs=0.1)
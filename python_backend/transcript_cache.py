@@ -0,0 +1,148 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    video_id TEXT NOT NULL,
+    language TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    body BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (video_id, language)
+);
+CREATE INDEX IF NOT EXISTS transcripts_expiry ON transcripts (expires_at);
+"""
+
+
+class CachedTranscript:
+    # variants holds encodings derived from body (other formats, compressed
+    # copies, the content digest), built on first use and dropped with the entry
+    __slots__ = ('body', 'status_code', 'created_at', 'expires_at', 'variants')
+
+    def __init__(self, body, status_code, created_at, expires_at):
+        self.body = body
+        self.status_code = status_code
+        self.created_at = created_at
+        self.expires_at = expires_at
+        self.variants = {}
+
+    def payload(self):
+        return json.loads(self.body)
+
+
+class TranscriptCache:
+    """Two-tier transcript cache keyed by video ID and language.
+
+    The first tier is a bounded in-process LRU holding serialized JSON bodies,
+    so a hit can be returned without re-encoding. The second tier is a SQLite
+    file with zlib-compressed bodies that survives restarts and is shared by
+    every worker on the host. "No transcript" results are cached too, with a
+    shorter TTL, so repeated lookups of caption-less videos do not hit YouTube.
+
+    Listeners registered with ``add_listener`` are called with
+    ``(video_id, language, payload, status_code)`` after every stored result.
+    """
+
+    def __init__(self, db_path, memory_size=512, ttl=7 * 24 * 3600, negative_ttl=3600):
+        self.db_path = db_path
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._listeners = []
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def get(self, video_id, language):
+        """Return ``(entry, tier)`` where tier is 'memory' or 'disk', or ``(None, None)`` on a miss."""
+        key = (video_id, language)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry.expires_at > now:
+                    self._memory.move_to_end(key)
+                    return entry, 'memory'
+                del self._memory[key]
+
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT status_code, body, created_at, expires_at FROM transcripts "
+                    "WHERE video_id = ? AND language = ? AND expires_at > ?",
+                    (video_id, language, now)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading transcript cache: {str(e)}")
+            return None, None
+        if row is None:
+            return None, None
+
+        entry = CachedTranscript(zlib.decompress(row[1]), row[0], row[2], row[3])
+        self._remember(key, entry)
+        return entry, 'disk'
+
+    def put(self, video_id, language, payload, status_code):
+        """Store a transcript response and return it as a cache entry.
+
+        Only final results (200 and 4xx) are cached; anything else, such as a
+        202 for a transcription still in progress or a server error, is
+        returned as an entry but not stored.
+        """
+        now = time.time()
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        if status_code != 200 and not 400 <= status_code < 500:
+            return CachedTranscript(body, status_code, now, now)
+
+        ttl = self.negative_ttl if status_code >= 400 else self.ttl
+        entry = CachedTranscript(body, status_code, now, now + ttl)
+        self._remember((video_id, language), entry)
+
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO transcripts (video_id, language, status_code, body, created_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (video_id, language, status_code, zlib.compress(body, 6), now, now + ttl)
+                )
+                conn.execute("DELETE FROM transcripts WHERE expires_at < ?", (now,))
+        except sqlite3.Error as e:
+            print(f"Error writing transcript cache: {str(e)}")
+
+        for listener in self._listeners:
+            try:
+                listener(video_id, language, payload, status_code)
+            except Exception as e:
+                print(f"Error in transcript cache listener: {str(e)}")
+        return entry
+
+    def iter_transcripts(self):
+        """Yield ``(video_id, language, payload)`` for every unexpired successful transcript on disk."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT video_id, language, body FROM transcripts WHERE status_code = 200 AND expires_at > ?",
+                (time.time(),)
+            ).fetchall()
+        for video_id, language, body in rows:
+            yield video_id, language, json.loads(zlib.decompress(body))
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
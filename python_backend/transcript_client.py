@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from youtube_transcript_api import YouTubeTranscriptApi, RequestBlocked, YouTubeRequestFailed
+
+
+class TranscriptClient:
+    """Long-lived YouTubeTranscriptApi clients bound to pooled HTTP sessions.
+
+    One client is shared by all threads of a worker process, so connections
+    to the proxy (and the TLS handshakes through it) are reused across
+    requests instead of being rebuilt on every call. Every endpoint of the
+    proxy pool gets its own session, sized to the worker's concurrency, and
+    each listing goes to the healthiest endpoint; if that one is throttled or
+    unreachable the listing is retried once on another.
+
+    Rotating proxies such as Webshare ask the library to send
+    ``Connection: close`` so every request gets a new exit IP. With
+    ``keep_alive`` enabled that header is dropped: each pooled connection
+    keeps its exit IP, and when YouTube blocks a request that endpoint's
+    connections are reset so its next request goes out on fresh ones.
+    The header is kept for a rotating proxy that retries blocked requests
+    itself (``retries_when_blocked``), since those retries would otherwise
+    reuse the blocked exit IP.
+
+    Track listings are cached per video for ``listing_ttl`` seconds so a
+    repeat lookup in another language only needs the transcript fetch.
+    """
+
+    def __init__(self, proxy_pool, pool_size=8, keep_alive=True, listing_ttl=600, listing_cache_size=256):
+        self.proxy_pool = proxy_pool
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.listing_ttl = listing_ttl
+        self.listing_cache_size = listing_cache_size
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._listings = OrderedDict()
+
+    def _build(self, endpoint):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, pool_block=False)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        api = YouTubeTranscriptApi(proxy_config=endpoint.proxy_config, http_client=session)
+        if self._keeps_alive(endpoint):
+            session.headers.pop('Connection', None)
+        return session, api
+
+    def _keeps_alive(self, endpoint):
+        config = endpoint.proxy_config
+        rotating = getattr(config, 'prevent_keeping_connections_alive', False)
+        return self.keep_alive and not (rotating and getattr(config, 'retries_when_blocked', 0) > 0)
+
+    def api(self, endpoint):
+        # Rebuild after a fork: pooled sockets must not be shared between processes
+        client = self._clients.get(endpoint.name)
+        if client is None or client[0] != os.getpid():
+            with self._lock:
+                client = self._clients.get(endpoint.name)
+                if client is None or client[0] != os.getpid():
+                    client = (os.getpid(), *self._build(endpoint))
+                    self._clients[endpoint.name] = client
+        return client[2]
+
+    def reset(self, endpoint):
+        """Drop an endpoint's pooled connections so its next request opens new ones."""
+        with self._lock:
+            client = self._clients.pop(endpoint.name, None)
+        if client is not None and client[0] == os.getpid():
+            client[1].close()
+
+    def _request(self, label, endpoint, fn, *args, **kwargs):
+        """Run one request on an acquired endpoint and report the outcome to the pool.
+
+        Throttling, HTTP failures and connection errors count against the
+        proxy; any other error (no transcript, video unavailable) means the
+        proxy did its job.
+        """
+        started = time.time()
+        ok, throttled = True, False
+        try:
+            return fn(*args, **kwargs)
+        except RequestBlocked:
+            ok, throttled = False, True
+            print(f"[WARNING] Transcript request blocked on proxy {endpoint.name}, resetting its connections")
+            self.reset(endpoint)
+            raise
+        except (YouTubeRequestFailed, requests.RequestException):
+            ok = False
+            raise
+        finally:
+            latency_ms = (time.time() - started) * 1000
+            self.proxy_pool.release(endpoint, ok, latency_ms, throttled)
+            print(f"[INFO] Transcript API {label} via {endpoint.name} took {latency_ms:.0f} ms")
+
+    def list_tracks(self, video_id):
+        """Return ``(tracks, endpoint, cached)``: every transcript track of a video and the proxy that listed them."""
+        now = time.time()
+        with self._lock:
+            cached = self._listings.get(video_id)
+            if cached is not None and now - cached[0] < self.listing_ttl:
+                self._listings.move_to_end(video_id)
+                return cached[1], cached[2], True
+
+        tried = []
+        attempts = min(2, len(self.proxy_pool.endpoints))
+        while True:
+            endpoint = self.proxy_pool.acquire(exclude=tried)
+            tried.append(endpoint)
+            try:
+                tracks = list(self._request('list', endpoint, self.api(endpoint).list, video_id))
+                break
+            except (RequestBlocked, YouTubeRequestFailed, requests.RequestException) as e:
+                if len(tried) >= attempts:
+                    raise
+                print(f"[WARNING] Listing {video_id} via {endpoint.name} failed ({type(e).__name__}), trying another proxy")
+
+        with self._lock:
+            self._listings[video_id] = (now, tracks, endpoint)
+            self._listings.move_to_end(video_id)
+            while len(self._listings) > self.listing_cache_size:
+                self._listings.popitem(last=False)
+        return tracks, endpoint, False
+
+    def fetch_best(self, video_id, languages):
+        """Fetch the best-matching track for ``languages`` with one listing and one fetch.
+
+        Returns ``(track, fetched_transcript)``, or ``(None, None)`` if the
+        video has no transcripts at all. The fetch goes through the proxy
+        that produced the listing, whose session the track is bound to. If
+        fetching from a cached listing fails (its signed track URLs may have
+        expired, or its proxy may be throttled now), the listing is
+        refreshed once.
+        """
+        for attempt in range(2):
+            tracks, endpoint, cached = self.list_tracks(video_id)
+            track = select_track(tracks, languages)
+            if track is None:
+                return None, None
+            try:
+                self.proxy_pool.acquire_endpoint(endpoint)
+                return track, self._request('fetch', endpoint, track.fetch)
+            except Exception:
+                if not cached:
+                    raise
+                print(f"[WARNING] Fetch from cached track listing for {video_id} failed, refreshing listing")
+                with self._lock:
+                    self._listings.pop(video_id, None)
+        return None, None
+
+
+def select_track(tracks, languages):
+    """Pick the best track: manual over generated, then by position in ``languages``.
+
+    If no track is in a preferred language, any track is used, manual first.
+    """
+    if not tracks:
+        return None
+    preference = {code: index for index, code in enumerate(languages)}
+    matching = [track for track in tracks if track.language_code in preference]
+    if matching:
+        return min(matching, key=lambda track: (track.is_generated, preference[track.language_code]))
+    return min(tracks, key=lambda track: track.is_generated)
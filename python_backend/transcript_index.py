@@ -0,0 +1,312 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    video_id TEXT NOT NULL,
+    language TEXT NOT NULL,
+    words BLOB NOT NULL,
+    counts BLOB NOT NULL,
+    positions BLOB NOT NULL,
+    offsets BLOB NOT NULL,
+    times BLOB NOT NULL,
+    texts BLOB NOT NULL,
+    UNIQUE (video_id, language)
+);
+"""
+
+TOKEN_PATTERN = re.compile(r"\w+(?:'\w+)*")
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def parse_query(query):
+    """Split a query into units, each a list of ``(token, is_prefix)`` elements.
+
+    Quoted text is a phrase; so is a bare word that tokenizes to several
+    tokens (``state-of-the-art``). A trailing ``*`` makes the last token of a
+    unit a prefix. Every unit must match for a video to be returned.
+    """
+    units = []
+    for quoted, bare in QUERY_PATTERN.findall(query or ''):
+        text = quoted if quoted else bare
+        tokens = tokenize(text)
+        if not tokens:
+            continue
+        prefix = text.rstrip().endswith('*')
+        units.append([(token, prefix and i == len(tokens) - 1) for i, token in enumerate(tokens)])
+    return units
+
+
+class _Document:
+    __slots__ = ('video_id', 'language', 'terms', 'length', 'offsets', 'starts', 'ends')
+
+    def __init__(self, video_id, language, terms, length, offsets, starts, ends):
+        self.video_id = video_id
+        self.language = language
+        self.terms = terms        # distinct token ids in the document
+        self.length = length      # number of tokens
+        self.offsets = offsets    # position of the first token of each segment
+        self.starts = starts
+        self.ends = ends
+
+
+class TranscriptIndex:
+    """Inverted index from words to the segments and timestamps they are spoken at.
+
+    Postings map each token to the positions it occurs at in every indexed
+    transcript, so phrases are matched by position and can span caption
+    segments. Videos are ranked by BM25 over the query's terms and phrases.
+
+    Documents are persisted to SQLite with their postings already grouped
+    per word (distinct words, position counts and positions as compressed
+    arrays), so loading costs one step per distinct word rather than per
+    token. Every process
+    keeps its own in-memory index and picks up documents added by other
+    processes (by sequence number) before each search.
+    """
+
+    def __init__(self, db_path, k1=1.2, b=0.75, max_prefix_terms=100):
+        self.db_path = db_path
+        self.k1 = k1
+        self.b = b
+        self.max_prefix_terms = max_prefix_terms
+        self._lock = threading.RLock()
+        self._vocab = {}
+        self._terms = []
+        self._sorted_terms = None
+        self._postings = {}
+        self._docs = {}
+        self._doc_ids = {}
+        self._next_doc = 0
+        self._total_tokens = 0
+        self._last_seq = 0
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, video_id, language, segments):
+        """Persist a transcript given as /transcript segments; searches in any process pick it up."""
+        grouped, offsets, starts, ends, texts = {}, array('I'), array('f'), array('f'), []
+        position = 0
+        for segment in segments:
+            offsets.append(position)
+            starts.append(segment['startTime'])
+            ends.append(segment['endTime'])
+            for word in tokenize(segment['text']):
+                grouped.setdefault(word, array('I')).append(position)
+                position += 1
+            texts.append(segment['text'].replace('\n', ' '))
+
+        counts, positions = array('I'), array('I')
+        for word_positions in grouped.values():
+            counts.append(len(word_positions))
+            positions.extend(word_positions)
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (video_id, language, words, counts, positions, offsets, times, texts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (video_id, language,
+                 zlib.compress(' '.join(grouped).encode('utf-8')),
+                 zlib.compress(counts.tobytes()),
+                 zlib.compress(positions.tobytes()),
+                 zlib.compress(offsets.tobytes()),
+                 zlib.compress(starts.tobytes() + ends.tobytes()),
+                 zlib.compress('\n'.join(texts).encode('utf-8')))
+            )
+
+    def sync(self):
+        """Index documents persisted since the last sync, by this or any other process."""
+        with self._lock:
+            try:
+                with self._connect() as conn:
+                    rows = conn.execute(
+                        "SELECT seq, video_id, language, words, counts, positions, offsets, times "
+                        "FROM documents WHERE seq > ? ORDER BY seq",
+                        (self._last_seq,)
+                    ).fetchall()
+            except sqlite3.Error as e:
+                print(f"Error reading transcript index: {str(e)}")
+                return
+            for seq, video_id, language, words, counts, positions, offsets, times in rows:
+                times = array('f', zlib.decompress(times))
+                count = len(times) // 2
+                self._index_document(
+                    video_id, language,
+                    zlib.decompress(words).decode('utf-8').split(),
+                    array('I', zlib.decompress(counts)),
+                    array('I', zlib.decompress(positions)),
+                    array('I', zlib.decompress(offsets)),
+                    times[:count], times[count:]
+                )
+                self._last_seq = seq
+
+    def _index_document(self, video_id, language, words, counts, positions, offsets, starts, ends):
+        key = (video_id, language)
+        if key in self._doc_ids:
+            self._remove(self._doc_ids.pop(key))
+
+        doc_id = self._next_doc
+        self._next_doc += 1
+        terms = array('I')
+        start = 0
+        for word, count in zip(words, counts):
+            token = self._vocab.get(word)
+            if token is None:
+                token = self._vocab[word] = len(self._terms)
+                self._terms.append(word)
+                self._sorted_terms = None
+            terms.append(token)
+            self._postings.setdefault(token, {})[doc_id] = positions[start:start + count]
+            start += count
+
+        self._docs[doc_id] = _Document(video_id, language, terms, len(positions), offsets, starts, ends)
+        self._doc_ids[key] = doc_id
+        self._total_tokens += len(positions)
+
+    def _remove(self, doc_id):
+        doc = self._docs.pop(doc_id)
+        for token in doc.terms:
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(doc_id, None)
+        self._total_tokens -= doc.length
+
+    def _expand(self, word, prefix):
+        """Token ids matching one query element."""
+        if not prefix:
+            token = self._vocab.get(word)
+            return {token} if token is not None and self._postings.get(token) else set()
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._terms)
+        matches = set()
+        index = bisect_left(self._sorted_terms, word)
+        while index < len(self._sorted_terms) and len(matches) < self.max_prefix_terms:
+            term = self._sorted_terms[index]
+            if not term.startswith(word):
+                break
+            if self._postings.get(self._vocab[term]):
+                matches.add(self._vocab[term])
+            index += 1
+        return matches
+
+    def _match(self, doc_id, elements):
+        """Start positions in a document where every element of a unit matches consecutively."""
+        first = sorted(p for token in elements[0] for p in self._postings[token].get(doc_id, ()))
+        if len(elements) == 1:
+            return first
+        following = []
+        for tokens in elements[1:]:
+            following.append({p for token in tokens for p in self._postings[token].get(doc_id, ())})
+        return [p for p in first if all(p + i + 1 in positions for i, positions in enumerate(following))]
+
+    def search(self, query, video_ids=None, offset=0, limit=20, max_matches=50):
+        """Return ``(total, results)``: matching videos ranked by relevance, one page of them.
+
+        Each result lists the segments the query matched, in time order, with
+        their start and end times and text.
+        """
+        units = parse_query(query)
+        if not units:
+            return 0, []
+        allowed = set(video_ids) if video_ids else None
+
+        with self._lock:
+            self.sync()
+            resolved = []
+            for unit in units:
+                elements = [self._expand(word, prefix) for word, prefix in unit]
+                if not all(elements):
+                    return 0, []
+                resolved.append(elements)
+
+            candidates = None
+            for elements in resolved:
+                docs = set()
+                for token in elements[0]:
+                    docs.update(self._postings[token])
+                candidates = docs if candidates is None else candidates & docs
+            if allowed is not None:
+                candidates = {d for d in candidates if self._docs[d].video_id in allowed}
+
+            matched = {}
+            for doc_id in candidates:
+                unit_positions = [self._match(doc_id, elements) for elements in resolved]
+                if all(unit_positions):
+                    matched[doc_id] = unit_positions
+            if not matched:
+                return 0, []
+
+            total_docs = len(self._docs)
+            average_length = self._total_tokens / total_docs
+            idf = []
+            for i in range(len(resolved)):
+                df = sum(1 for positions in matched.values() if positions[i])
+                idf.append(math.log(1 + (total_docs - df + 0.5) / (df + 0.5)))
+
+            scored = []
+            for doc_id, unit_positions in matched.items():
+                length_norm = 1 - self.b + self.b * self._docs[doc_id].length / average_length
+                score = sum(
+                    weight * len(positions) * (self.k1 + 1) / (len(positions) + self.k1 * length_norm)
+                    for weight, positions in zip(idf, unit_positions)
+                )
+                scored.append((score, doc_id))
+            scored.sort(key=lambda item: (-item[0], self._docs[item[1]].video_id))
+
+            page = []
+            for score, doc_id in scored[offset:offset + limit]:
+                doc = self._docs[doc_id]
+                segments = sorted({
+                    bisect_right(doc.offsets, position) - 1
+                    for positions in matched[doc_id] for position in positions
+                })
+                page.append((doc, score, segments))
+
+        results = []
+        for doc, score, segments in page:
+            texts = self._segment_texts(doc.video_id, doc.language)
+            results.append({
+                'videoId': doc.video_id,
+                'language': doc.language,
+                'score': round(score, 4),
+                'matchCount': len(segments),
+                'matches': [
+                    {
+                        'segmentIndex': index,
+                        'startTime': round(doc.starts[index], 3),
+                        'endTime': round(doc.ends[index], 3),
+                        'text': texts[index] if index < len(texts) else None
+                    }
+                    for index in segments[:max_matches]
+                ]
+            })
+        return len(scored), results
+
+    def _segment_texts(self, video_id, language):
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT texts FROM documents WHERE video_id = ? AND language = ?", (video_id, language)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading transcript index: {str(e)}")
+            return []
+        return zlib.decompress(row[0]).decode('utf-8').split('\n') if row else []
@@ -0,0 +1,288 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import httplib2
+    from googleapiclient.discovery import build
+    from googleapiclient.errors import HttpError
+    API_ERRORS = (HttpError, httplib2.HttpLib2Error, OSError)
+except ImportError:
+    httplib2 = None
+    build = None
+    API_ERRORS = (OSError,)
+
+# videos.list accepts at most this many IDs per call
+BATCH_SIZE = 50
+# API durations are whole seconds, so a clip may end this much past them
+DURATION_TOLERANCE = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS video_metadata (
+    video_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS video_metadata_expiry ON video_metadata (expires_at);
+"""
+
+ISO_DURATION = re.compile(
+    r'^P(?:(?P<days>\d+)D)?(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+(?:\.\d+)?)S)?)?$'
+)
+
+
+def parse_duration(value):
+    """Seconds in an ISO 8601 duration as used by the Data API (``PT1H2M3S``); None if it cannot be parsed."""
+    match = ISO_DURATION.match(value or '')
+    if not match:
+        return None
+    parts = {name: float(amount or 0) for name, amount in match.groupdict().items()}
+    return parts['days'] * 86400 + parts['hours'] * 3600 + parts['minutes'] * 60 + parts['seconds']
+
+
+def format_duration(seconds):
+    """ISO 8601 duration for ``seconds``, the inverse of ``parse_duration`` for whole seconds."""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"PT{hours}H{minutes}M{seconds}S"
+
+
+def parse_item(item):
+    """Duration, definition and availability of one ``videos.list`` item."""
+    snippet = item.get('snippet', {})
+    details = item.get('contentDetails', {})
+    status = item.get('status', {})
+    reason = None
+    if status.get('privacyStatus') == 'private':
+        reason = 'private'
+    elif status.get('uploadStatus') in ('deleted', 'failed', 'rejected'):
+        reason = status['uploadStatus']
+    elif status.get('uploadStatus') == 'uploaded':
+        reason = 'still processing'
+    elif snippet.get('liveBroadcastContent') in ('live', 'upcoming'):
+        reason = f"{snippet['liveBroadcastContent']} broadcast"
+    return {
+        'videoId': item['id'],
+        'title': snippet.get('title'),
+        'durationSeconds': parse_duration(details.get('duration')),
+        'definition': details.get('definition'),
+        'ageRestricted': details.get('contentRating', {}).get('ytRating') == 'ytAgeRestricted',
+        'available': reason is None,
+        'reason': reason,
+    }
+
+
+class YouTubeDataApi:
+    """``videos.list`` of the YouTube Data API v3, one client per thread (httplib2 is not thread-safe)."""
+
+    authoritative = True
+
+    def __init__(self, api_key, timeout=10):
+        if build is None:
+            raise RuntimeError("google-api-python-client is not installed")
+        self.api_key = api_key
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = build('youtube', 'v3', developerKey=self.api_key,
+                           http=httplib2.Http(timeout=self.timeout), cache_discovery=False)
+            self._local.client = client
+        return client
+
+    def list(self, video_ids):
+        """Items for up to ``BATCH_SIZE`` IDs; videos that are deleted or hidden from us are left out."""
+        response = self._client().videos().list(
+            part='contentDetails,status,snippet', id=','.join(video_ids), maxResults=BATCH_SIZE
+        ).execute()
+        return response.get('items', [])
+
+
+class LocalVideoApi:
+    """Stand-in for ``YouTubeDataApi`` when no API key is set, and for tests.
+
+    Returns items shaped like ``videos.list`` from ``items`` (a dict of
+    video ID to item, or the path of a JSON file holding one) and from the
+    ``<videoId>.index.json`` files that ``SourceFetcher`` writes next to
+    cached sources in ``index_dir``. It only knows some videos, so unless
+    ``authoritative`` is set a missing video counts as unknown rather than
+    unavailable.
+    """
+
+    def __init__(self, items=None, index_dir=None, authoritative=False):
+        if isinstance(items, str):
+            with open(items, 'r') as f:
+                items = json.load(f)
+        self.items = dict(items or {})
+        self.index_dir = index_dir
+        self.authoritative = authoritative
+        self.calls = 0
+
+    def list(self, video_ids):
+        if len(video_ids) > BATCH_SIZE:
+            raise ValueError(f"videos.list accepts at most {BATCH_SIZE} IDs, got {len(video_ids)}")
+        self.calls += 1
+        items = []
+        for video_id in video_ids:
+            item = self.items.get(video_id) or self._from_index(video_id)
+            if item is not None:
+                items.append(dict(item, id=video_id))
+        return items
+
+    def _from_index(self, video_id):
+        if not self.index_dir:
+            return None
+        try:
+            with open(os.path.join(self.index_dir, f"{video_id}.index.json"), 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not index.get('duration'):
+            return None
+        return {
+            'snippet': {'liveBroadcastContent': 'none'},
+            'contentDetails': {
+                'duration': format_duration(index['duration']),
+                'definition': 'hd' if (index.get('height') or 0) >= 720 else 'sd',
+            },
+            'status': {'uploadStatus': 'processed', 'privacyStatus': 'public'},
+        }
+
+
+class VideoMetadataService:
+    """Batched, cached video metadata, so merges can be checked before anything is downloaded.
+
+    IDs missing from the cache are looked up ``BATCH_SIZE`` at a time.
+    Like the stream URL cache this is an in-process LRU in front of a
+    SQLite file shared by every worker on the host. Available videos are
+    kept for ``ttl`` seconds and unavailable ones for ``negative_ttl``,
+    since a private video may be made public again. If the API fails, the
+    affected videos are reported as unknown and nothing is cached.
+    """
+
+    def __init__(self, api, db_path, ttl=21600, negative_ttl=600, memory_size=2048):
+        self.api = api
+        self.db_path = db_path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def lookup(self, video_ids):
+        """Metadata for each ID, or None for a video whose state is unknown."""
+        video_ids = list(dict.fromkeys(video_ids))
+        now = time.time()
+        found = self._cached(video_ids, now)
+        missing = [video_id for video_id in video_ids if video_id not in found]
+        for start in range(0, len(missing), BATCH_SIZE):
+            batch = missing[start:start + BATCH_SIZE]
+            try:
+                items = self.api.list(batch)
+            except API_ERRORS as e:
+                print(f"[WARNING] Video metadata lookup failed for {len(batch)} videos: {str(e)}")
+                continue
+            fetched = {item['id']: parse_item(item) for item in items}
+            if self.api.authoritative:
+                for video_id in batch:
+                    fetched.setdefault(video_id, {
+                        'videoId': video_id, 'title': None, 'durationSeconds': None, 'definition': None,
+                        'ageRestricted': False, 'available': False, 'reason': 'not found or private',
+                    })
+            self._store(fetched, now)
+            found.update(fetched)
+        return {video_id: found.get(video_id) for video_id in video_ids}
+
+    def _cached(self, video_ids, now):
+        found = {}
+        with self._lock:
+            for video_id in video_ids:
+                entry = self._memory.get(video_id)
+                if entry is not None:
+                    if entry[1] > now:
+                        self._memory.move_to_end(video_id)
+                        found[video_id] = entry[0]
+                    else:
+                        del self._memory[video_id]
+        missing = [video_id for video_id in video_ids if video_id not in found]
+        if not missing:
+            return found
+        try:
+            with self._connect() as conn:
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    rows = conn.execute(
+                        f"SELECT video_id, data, expires_at FROM video_metadata "
+                        f"WHERE video_id IN ({','.join('?' * len(batch))}) AND expires_at > ?",
+                        (*batch, now)
+                    ).fetchall()
+                    for video_id, data, expires_at in rows:
+                        found[video_id] = json.loads(data)
+                        self._remember(video_id, (found[video_id], expires_at))
+        except sqlite3.Error as e:
+            print(f"Error reading video metadata cache: {str(e)}")
+        return found
+
+    def _store(self, fetched, now):
+        rows = []
+        for video_id, metadata in fetched.items():
+            expires_at = now + (self.ttl if metadata['available'] else self.negative_ttl)
+            self._remember(video_id, (metadata, expires_at))
+            rows.append((video_id, json.dumps(metadata), expires_at))
+        if not rows:
+            return
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO video_metadata (video_id, data, expires_at) VALUES (?, ?, ?)", rows
+                )
+                conn.execute("DELETE FROM video_metadata WHERE expires_at < ?", (now,))
+        except sqlite3.Error as e:
+            print(f"Error writing video metadata cache: {str(e)}")
+
+    def _remember(self, video_id, entry):
+        with self._lock:
+            self._memory[video_id] = entry
+            self._memory.move_to_end(video_id)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def clip_errors(self, clips):
+        """Why each clip cannot be merged: its video is unavailable, or it lies outside the video.
+
+        Clips of videos whose metadata is unknown are not checked.
+        """
+        metadata = self.lookup([clip['videoId'] for clip in clips if clip.get('videoId')])
+        errors = []
+        for position, clip in enumerate(clips, start=1):
+            info = metadata.get(clip.get('videoId'))
+            if info is None:
+                continue
+            if not info['available']:
+                errors.append(f"Clip {position}: video {info['videoId']} is unavailable ({info['reason']})")
+                continue
+            duration = info['durationSeconds']
+            if not duration:
+                continue
+            start_time = float(clip.get('startTime', 0))
+            end_time = float(clip.get('endTime', 0))
+            if start_time >= duration:
+                errors.append(f"Clip {position}: starts at {start_time:g}s, after the end of "
+                              f"video {info['videoId']} ({duration:g}s)")
+            elif end_time > duration + DURATION_TOLERANCE:
+                errors.append(f"Clip {position}: ends at {end_time:g}s, after the end of "
+                              f"video {info['videoId']} ({duration:g}s)")
+        return errors
@@ -0,0 +1,282 @@
+"""
+Speech-to-text fallback for videos without captions.
+
+The audio track is downloaded on its own, decoded to 16 kHz mono PCM through
+an ffmpeg pipe and cut into chunks at silences, so every chunk is well under
+the Whisper upload limit and no word is split between two chunks. Chunks are
+transcribed concurrently while the rest of the audio is still being decoded,
+then their segments are shifted by the chunk offset and merged in order.
+
+Set WHISPER_BACKEND=stub to replace the OpenAI API with a local transcriber
+that returns placeholder segments, for tests and offline development.
+"""
+import io
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import yt_dlp
+
+from download_scheduler import YOUTUBE_MEDIA_HOST
+
+SAMPLE_RATE = 16000
+BYTES_PER_SECOND = SAMPLE_RATE * 2  # 16-bit mono
+READ_SIZE = 64 * 1024
+
+SILENCE_PATTERN = re.compile(r'silence_(start|end): (-?[\d.]+)')
+
+
+class OpenAIWhisperBackend:
+    """Transcribe WAV chunks with the OpenAI Whisper API."""
+
+    def __init__(self, model=None, api_key=None):
+        import openai
+        self.model = model or os.getenv('WHISPER_MODEL', 'whisper-1')
+        self.client = openai.OpenAI(api_key=api_key or os.getenv('OPENAI_API_KEY'))
+
+    def transcribe(self, wav_bytes, language, duration):
+        response = self.client.audio.transcriptions.create(
+            model=self.model,
+            file=('chunk.wav', wav_bytes, 'audio/wav'),
+            language=language,
+            response_format='verbose_json'
+        )
+        segments = _field(response, 'segments') or []
+        if not segments and _field(response, 'text'):
+            return [(0.0, duration, _field(response, 'text'))]
+        return [(_field(s, 'start'), _field(s, 'end'), _field(s, 'text')) for s in segments]
+
+
+class StubWhisperBackend:
+    """Local stand-in for the Whisper API: one placeholder segment per 10 seconds of audio."""
+
+    segment_seconds = 10.0
+
+    def transcribe(self, wav_bytes, language, duration):
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(start + self.segment_seconds, duration)
+            segments.append((start, end, f"[{language} speech]"))
+            start = end
+        return segments
+
+
+BACKENDS = {
+    'openai': OpenAIWhisperBackend,
+    'stub': StubWhisperBackend,
+}
+
+
+class WhisperTranscriber:
+    def __init__(self, language="en", backend=None, chunk_seconds=120, min_chunk_seconds=30, max_chunk_seconds=300,
+                 concurrency=None, silence_db=-35, silence_seconds=0.4, ffmpeg_path='ffmpeg', cookies_file=None,
+                 engine=None, scheduler=None):
+        self.language = language
+        backend = backend or os.getenv('WHISPER_BACKEND', 'openai')
+        if isinstance(backend, str):
+            if backend not in BACKENDS:
+                raise ValueError(f"Unknown Whisper backend '{backend}'. Must be one of: {', '.join(BACKENDS)}")
+            backend = BACKENDS[backend]()
+        self.backend = backend
+        self.chunk_seconds = chunk_seconds
+        self.min_chunk_seconds = min_chunk_seconds
+        self.max_chunk_seconds = max_chunk_seconds
+        self.concurrency = concurrency or int(os.getenv('WHISPER_CONCURRENCY', 4))
+        self.silence_db = silence_db
+        self.silence_seconds = silence_seconds
+        self.ffmpeg_path = ffmpeg_path
+        self.cookies_file = cookies_file
+        self.engine = engine
+        self.scheduler = scheduler
+
+    def generate_transcript(self, video_id):
+        """Download the audio of a YouTube video and return its transcript segments."""
+        with tempfile.TemporaryDirectory(prefix='whisper_') as workdir:
+            audio_path = self.download_audio(video_id, workdir)
+            return self.transcribe_file(audio_path)
+
+    def download_audio(self, video_id, workdir):
+        """Download only the audio stream (no video) and return the file path.
+
+        Uses the shared ``engine`` (a YtDlpEngine) when one was given, at
+        background priority through ``scheduler`` (a DownloadScheduler) if set.
+        """
+        url = f'https://www.youtube.com/watch?v={video_id}'
+        outtmpl = os.path.join(workdir, f'{video_id}.%(ext)s')
+        if self.engine is not None and self.scheduler is not None:
+            with self.scheduler.background(), self.scheduler.transfer(YOUTUBE_MEDIA_HOST) as transfer:
+                info = self.engine.download(url, outtmpl, 'bestaudio[ext=m4a]/bestaudio/best',
+                                            progress=transfer.ytdlp_progress())
+        elif self.engine is not None:
+            info = self.engine.download(url, outtmpl, 'bestaudio[ext=m4a]/bestaudio/best')
+        else:
+            info = self._download_audio_standalone(url, outtmpl)
+        downloads = (info or {}).get('requested_downloads') or []
+        path = downloads[0].get('filepath') if downloads else None
+        if not path or not os.path.exists(path):
+            raise RuntimeError(f"Audio download for {video_id} produced no file")
+        print(f"[INFO] Downloaded audio for {video_id}: {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+        return path
+
+    def _download_audio_standalone(self, url, outtmpl):
+        ydl_opts = {
+            'format': 'bestaudio[ext=m4a]/bestaudio/best',
+            'outtmpl': outtmpl,
+            'quiet': True,
+            'noplaylist': True,
+            'retries': 10,
+            'fragment_retries': 10,
+        }
+        if self.cookies_file and os.path.exists(self.cookies_file) and os.path.getsize(self.cookies_file) > 100:
+            ydl_opts['cookiefile'] = self.cookies_file
+
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            return ydl.extract_info(url, download=True)
+
+    def transcribe_file(self, path):
+        """Transcribe a local audio or video file and return segments in the /transcript format."""
+        cuts = plan_cuts(self.detect_silences(path), self.chunk_seconds, self.min_chunk_seconds, self.max_chunk_seconds)
+
+        # Bound the decoded chunks held in memory while waiting for a free transcription slot
+        pending = threading.BoundedSemaphore(self.concurrency * 2)
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for offset, pcm in self.iter_chunks(path, cuts):
+                pending.acquire()
+                future = pool.submit(self._transcribe_chunk, offset, pcm)
+                future.add_done_callback(lambda _: pending.release())
+                futures.append(future)
+            chunks = [future.result() for future in futures]
+        print(f"[INFO] Transcribed {len(chunks)} audio chunks")
+        return merge_segments(chunks)
+
+    def detect_silences(self, path):
+        """Return ``(start, end)`` pairs of silent stretches, from ffmpeg's silencedetect filter."""
+        result = subprocess.run(
+            [self.ffmpeg_path, '-hide_banner', '-nostats', '-i', path, '-vn',
+             '-af', f'silencedetect=noise={self.silence_db}dB:d={self.silence_seconds}', '-f', 'null', '-'],
+            capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg silence detection failed: {result.stderr[-500:]}")
+
+        silences, start = [], None
+        for kind, value in SILENCE_PATTERN.findall(result.stderr):
+            if kind == 'start':
+                start = max(float(value), 0.0)
+            elif start is not None:
+                silences.append((start, float(value)))
+                start = None
+        return silences
+
+    def iter_chunks(self, path, cuts):
+        """Decode to 16 kHz mono PCM through a pipe and yield ``(offset_seconds, pcm_bytes)`` per chunk.
+
+        Chunks end at the planned cuts, or after ``max_chunk_seconds`` if
+        there is no silence to cut at.
+        """
+        process = subprocess.Popen(
+            [self.ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-i', path, '-vn',
+             '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 's16le', 'pipe:1'],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        cut_bytes = [int(cut * SAMPLE_RATE) * 2 for cut in cuts]
+        max_bytes = int(self.max_chunk_seconds * SAMPLE_RATE) * 2
+        chunk_start = 0
+        next_cut = 0
+        buffer = bytearray()
+        try:
+            while True:
+                data = process.stdout.read(READ_SIZE)
+                if data:
+                    buffer.extend(data)
+                while True:
+                    while next_cut < len(cut_bytes) and cut_bytes[next_cut] <= chunk_start:
+                        next_cut += 1
+                    boundary = chunk_start + max_bytes
+                    if next_cut < len(cut_bytes):
+                        boundary = min(boundary, cut_bytes[next_cut])
+                    if chunk_start + len(buffer) < boundary:
+                        break
+                    size = boundary - chunk_start
+                    yield chunk_start / BYTES_PER_SECOND, bytes(buffer[:size])
+                    del buffer[:size]
+                    chunk_start = boundary
+                if not data:
+                    break
+        finally:
+            process.stdout.close()
+            stderr = process.stderr.read().decode('utf-8', errors='replace')
+            process.wait()
+
+        if process.returncode != 0:
+            raise RuntimeError(f"ffmpeg audio decoding failed: {stderr[-500:]}")
+        # Skip a trailing fragment too short to contain speech
+        if len(buffer) >= BYTES_PER_SECOND // 10:
+            yield chunk_start / BYTES_PER_SECOND, bytes(buffer)
+
+    def _transcribe_chunk(self, offset, pcm):
+        duration = len(pcm) / BYTES_PER_SECOND
+        segments = self.backend.transcribe(pcm_to_wav(pcm), self.language, duration)
+        return [(offset + start, offset + min(end, duration), text) for start, end, text in segments]
+
+
+def plan_cuts(silences, chunk_seconds, min_chunk_seconds, max_chunk_seconds):
+    """Chunk boundaries at the silence midpoints closest to ``chunk_seconds`` apart.
+
+    A chunk is at least ``min_chunk_seconds`` long; if there is no silence
+    within ``max_chunk_seconds`` it is cut there regardless.
+    """
+    midpoints = [(start + end) / 2 for start, end in silences]
+    cuts = []
+    start = 0.0
+    while any(m > start + min_chunk_seconds for m in midpoints):
+        window = [m for m in midpoints if start + min_chunk_seconds <= m <= start + max_chunk_seconds]
+        if window:
+            start = min(window, key=lambda m: abs(m - (start + chunk_seconds)))
+        else:
+            start += max_chunk_seconds
+        cuts.append(start)
+    return cuts
+
+
+def merge_segments(chunks):
+    """Join per-chunk ``(start, end, text)`` lists, already shifted to absolute time, into one transcript."""
+    merged = []
+    for segments in chunks:
+        for start, end, text in segments:
+            text = (text or '').strip()
+            if not text:
+                continue
+            start = float(start)
+            end = max(float(end), start)
+            merged.append({
+                'id': len(merged) + 1,
+                'text': text,
+                'startTime': round(start, 3),
+                'endTime': round(end, 3),
+                'duration': round(end - start, 3)
+            })
+    return merged
+
+
+def pcm_to_wav(pcm):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def _field(obj, name):
+    # The OpenAI client returns objects; older versions and raw responses use dicts
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
@@ -0,0 +1,175 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import yt_dlp
+
+def _backoff(n):
+    """Jittered exponential wait before yt-dlp's retry ``n + 1``."""
+    return random.uniform(0, min(30, 2 ** n))
+
+
+BASE_OPTIONS = {
+    'quiet': True,
+    'noprogress': True,
+    'no_warnings': False,
+    'noplaylist': True,
+    'nocheckcertificate': True,
+    'retries': 3,
+    'fragment_retries': 3,
+    'skip_unavailable_fragments': True,
+    'extractor_retries': 3,
+    'file_access_retries': 3,
+    'retry_sleep_functions': {'http': _backoff, 'fragment': _backoff, 'extractor': _backoff},
+    'hls_prefer_native': True,
+    'hls_use_mpegts': True,
+    'external_downloader_args': ['ffmpeg:-nostats', 'ffmpeg:-loglevel', 'ffmpeg:warning'],
+}
+
+# Sent when there is no cookie jar, to look more like a browser
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+    'sec-ch-ua': '" Not A;Brand";v="99", "Chromium";v="91"',
+    'sec-ch-ua-mobile': '?0'
+}
+
+
+class _EngineLogger:
+    """Route yt-dlp's output through the app's log format instead of its own stdout writer."""
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+
+    def debug(self, message):
+        if self.verbose:
+            print(f"[DEBUG] yt-dlp: {message}")
+
+    def info(self, message):
+        print(f"[INFO] yt-dlp: {message}")
+
+    def warning(self, message):
+        print(f"[WARNING] yt-dlp: {message}")
+
+    def error(self, message):
+        print(f"[ERROR] yt-dlp: {message}")
+
+
+class YtDlpEngine:
+    """Reusable in-process yt-dlp instances for downloads and metadata lookups.
+
+    Building a ``YoutubeDL`` loads the extractor list and cookie jar, and
+    its YouTube extractor caches player code between videos, so each thread
+    keeps one instance with the shared options and reuses it. Only the
+    output template and format change per call. An instance is rebuilt when
+    the cookie jar returned by ``cookiefile`` changes.
+
+    ``progress`` callbacks passed to ``download`` receive yt-dlp's progress
+    dicts for that call only, and ``params`` overrides options (such as
+    retry counts) for that call only.
+    """
+
+    def __init__(self, options=None, cookiefile=None, verbose=False):
+        self.options = dict(BASE_OPTIONS, **(options or {}))
+        self.cookiefile = cookiefile
+        self.verbose = verbose
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.instances_built = 0
+        self.build_seconds = 0.0
+        self.calls = 0
+        self.call_seconds = 0.0
+
+    def _cookie_signature(self):
+        path = self.cookiefile() if self.cookiefile else None
+        try:
+            return path, os.path.getmtime(path) if path else None
+        except OSError:
+            return None, None
+
+    def _instance(self):
+        signature = self._cookie_signature()
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl is not None and self._local.signature == signature:
+            return ydl
+        if ydl is not None:
+            ydl.close()
+
+        started = time.time()
+        options = dict(self.options, logger=_EngineLogger(self.verbose), progress_hooks=[self._on_progress])
+        if signature[0]:
+            options['cookiefile'] = signature[0]
+        else:
+            options['http_headers'] = dict(BROWSER_HEADERS)
+        ydl = yt_dlp.YoutubeDL(options)
+        self._local.ydl = ydl
+        self._local.signature = signature
+        self._local.selectors = {}
+        with self._lock:
+            self.instances_built += 1
+            self.build_seconds += time.time() - started
+        return ydl
+
+    def _on_progress(self, progress):
+        if progress.get('status') == 'finished':
+            print(f"[INFO] yt-dlp finished {progress.get('filename')}")
+        callback = getattr(self._local, 'progress', None)
+        if callback is not None:
+            callback(progress)
+
+    @contextmanager
+    def _call(self, outtmpl=None, format_spec=None, progress=None, params=None):
+        ydl = self._instance()
+        saved = (dict(ydl.params['outtmpl']), ydl.params.get('format'), ydl.format_selector)
+        saved_params = {key: ydl.params[key] for key in (params or {}) if key in ydl.params}
+        ydl.params.update(params or {})
+        if outtmpl is not None:
+            ydl.params['outtmpl'] = dict(saved[0], default=outtmpl)
+        if format_spec is not None:
+            selector = self._local.selectors.get(format_spec)
+            if selector is None:
+                selector = self._local.selectors[format_spec] = ydl.build_format_selector(format_spec)
+            ydl.params['format'] = format_spec
+            ydl.format_selector = selector
+        self._local.progress = progress
+        started = time.time()
+        try:
+            yield ydl
+        finally:
+            for key in params or {}:
+                ydl.params.pop(key, None)
+            ydl.params.update(saved_params)
+            ydl.params['outtmpl'], ydl.params['format'], ydl.format_selector = saved
+            self._local.progress = None
+            with self._lock:
+                self.calls += 1
+                self.call_seconds += time.time() - started
+
+    def download(self, url, outtmpl, format_spec, progress=None, params=None):
+        """Download ``url`` to ``outtmpl`` and return its info dict; raises on failure."""
+        with self._call(outtmpl, format_spec, progress, params) as ydl:
+            return ydl.extract_info(url, download=True)
+
+    def extract_info(self, url, process=True):
+        """Metadata for ``url`` without downloading anything."""
+        with self._call() as ydl:
+            return ydl.extract_info(url, download=False, process=process)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'instancesBuilt': self.instances_built,
+                'meanBuildMs': round(self.build_seconds / self.instances_built * 1000, 1) if self.instances_built else None,
+                'calls': self.calls,
+                'meanCallSeconds': round(self.call_seconds / self.calls, 2) if self.calls else None,
+            }